@@ -0,0 +1,141 @@
+import argparse
+import datetime
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from lets_alexandria.core_entities import Article, Library
+
+# the subjects of the original assignment
+TAGS = ['esporte', 'política', 'tecnologia']
+
+
+# synthetic library whose words follow a Zipf law: the word of rank r is drawn with weight 1 / r ** zipf
+def generate_library(n_articles, vocabulary_size=5000, words_per_article=200, zipf=1.1, seed=0, name='benchmark'):
+    generator = random.Random(seed)
+    words = ['palavra' + str(i) for i in range(vocabulary_size)]
+    cumulative_weights = list(itertools.accumulate(1 / rank ** zipf for rank in range(1, vocabulary_size + 1)))
+    first_day = datetime.date(2000, 1, 1).toordinal()
+    library = Library(name)
+    for i in range(n_articles):
+        text = ' '.join(generator.choices(words, cum_weights=cumulative_weights, k=words_per_article))
+        date = datetime.date.fromordinal(first_day + generator.randrange(8000)).strftime('%d/%m/%Y')
+        library.add_article(Article('artigo ' + str(i), generator.choice(TAGS), date, text))
+    return library
+
+
+# runs the operation once for the time and, if asked, once more under tracemalloc for the peak memory
+# (tracing slows everything down, so both are never measured in the same run)
+def measure(operation, items=1, memory=True):
+    start = time.perf_counter()
+    operation()
+    seconds = time.perf_counter() - start
+    answer = {
+        'seconds': seconds,
+        'items': items,
+        'items_per_second': items / seconds if seconds > 0 else None}
+    if memory:
+        tracemalloc.start()
+        try:
+            operation()
+            answer['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return answer
+
+
+# a fresh library over the same articles, so indexes and caches start cold
+def _on_copy(articles, operation):
+    library = Library('copy', articles)
+    try:
+        return operation(library)
+    finally:
+        library.clear()
+
+
+def run_benchmark(n_articles=1000, vocabulary_size=5000, words_per_article=200, zipf=1.1, seed=0,
+                  backends=('index',), workers=None, queries=100, memory=True):
+    results = {
+        'parameters': {
+            'articles': n_articles,
+            'vocabulary': vocabulary_size,
+            'words_per_article': words_per_article,
+            'zipf': zipf,
+            'seed': seed,
+            'backends': list(backends),
+            'workers': workers,
+            'queries': queries},
+        'operations': {}}
+    operations = results['operations']
+
+    generation = {}
+    operations['generate'] = measure(lambda: generation.update(library=generate_library(
+        n_articles, vocabulary_size, words_per_article, zipf, seed)), n_articles, memory)
+    library = generation['library']
+    articles = library.get_articles()
+    queried = articles[:queries]
+
+    with tempfile.TemporaryDirectory() as directory:
+        for extension in ('jsonl', 'txt'):
+            filepath = os.path.join(directory, 'benchmark.' + extension)
+            operations['save_' + extension] = measure(lambda: library.save(filepath), n_articles, memory)
+            operations['load_' + extension] = measure(lambda: Library('load').load(filepath), n_articles, memory)
+        filepath = os.path.join(directory, 'benchmark.jsonl')
+        operations['load_jsonl_lazy'] = measure(lambda: Library('load').load(filepath, lazy=True), n_articles, memory)
+
+    operations['get_article_by_name'] = measure(
+        lambda: [library.get_article_by_name(article.get_title()) for article in queried], len(queried), memory)
+    operations['get_articles_by_tag'] = measure(
+        lambda: [library.get_articles_by_tag(tag) for tag in TAGS], len(TAGS), memory)
+    operations['get_articles_by_date'] = measure(
+        lambda: [library.get_articles_by_date(article.get_date()) for article in queried], len(queried), memory)
+    operations['get_articles_sorted'] = measure(library.get_articles_sorted, n_articles, memory)
+
+    operations['calculate_similarities'] = measure(
+        lambda: [library.calculate_similarities(article) for article in queried], len(queried) * n_articles, memory)
+    operations['get_greatest_similarity'] = measure(
+        lambda: [library.get_greatest_similarity(article) for article in queried], len(queried), memory)
+    operations['get_most_similar'] = measure(
+        lambda: [library.get_most_similar(article, 10) for article in queried], len(queried), memory)
+    for backend in backends:
+        operations['calculate_all_similarities_' + backend] = measure(
+            lambda: _on_copy(articles, lambda copy: copy.calculate_all_similarities(backend=backend, workers=workers)),
+            n_articles * n_articles, memory)
+
+    operations['remove_article_by_name'] = measure(
+        lambda: _on_copy(articles, lambda copy: [copy.remove_article_by_name(article.get_title())
+                                                  for article in queried]), len(queried), memory)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark do Alexandria com bibliotecas sintéticas')
+    parser.add_argument('--articles', type=int, default=1000)
+    parser.add_argument('--vocabulary', type=int, default=5000)
+    parser.add_argument('--words', type=int, default=200, help='palavras por artigo')
+    parser.add_argument('--zipf', type=float, default=1.1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backends', nargs='+', default=['index'], choices=['index', 'sparse', 'parallel'])
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--no-memory', action='store_true', help='não mede o pico de memória')
+    parser.add_argument('--output', help='arquivo JSON de saída (padrão: saída padrão)')
+    arguments = parser.parse_args(argv)
+
+    results = run_benchmark(arguments.articles, arguments.vocabulary, arguments.words, arguments.zipf,
+                            arguments.seed, arguments.backends, arguments.workers, arguments.queries,
+                            not arguments.no_memory)
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+import argparse
+import datetime
+import json
+import os
+import sys
+
+# one command per run, for scripts: every command reads a library file, does one operation and writes
+# its rows to the standard output as JSON (a list of objects) or CSV. The library modules are only
+# imported once the arguments are parsed, so --help and argument errors answer right away
+
+
+def _parse_date(text):
+    try:
+        return datetime.datetime.strptime(text, '%d/%m/%Y').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError("data inválida, use dd/mm/yyyy: " + text)
+
+
+# .shards directories are read shard by shard, see sharded_library. A file that can't be read raises
+# ValueError instead of printing to the output
+def open_library(filepath, must_exist=True):
+    from lets_alexandria.storage import is_sharded
+    if is_sharded(filepath):
+        from lets_alexandria.sharded_library import ShardedLibrary
+        library = ShardedLibrary(os.path.basename(filepath))
+    else:
+        from lets_alexandria.core_entities import Library
+        library = Library(os.path.splitext(os.path.basename(filepath))[0])
+    if os.path.exists(filepath):
+        try:
+            library.load(filepath, lazy=True, strict=True)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError("Não foi possível carregar a biblioteca " + filepath + ": " + repr(e))
+    elif must_exist:
+        raise FileNotFoundError("Biblioteca não encontrada: " + filepath)
+    return library
+
+
+# title, tag and date of an article, the row every listing gives (also used by the server)
+def article_row(article):
+    return {'Title': article.get_title(), 'Tag': article.get_tag(), 'Date': article.get_date().strftime('%d/%m/%Y')}
+
+
+def _load(library, arguments):
+    counts = {}
+    for article in library.get_articles():
+        counts[article.get_tag()] = counts.get(article.get_tag(), 0) + 1
+    return [{'Library': library.get_name(), 'Tag': tag, 'Articles': count} for tag, count in sorted(counts.items())]
+
+
+# newest first, like the interactive listing
+def _list(library, arguments):
+    if arguments.since is None and arguments.until is None:
+        articles = library.iter_articles_sorted()
+    else:
+        since = arguments.since or datetime.date.min
+        until = arguments.until or datetime.date.max
+        articles = reversed(library.get_articles_between(since, until))
+    rows = (article_row(article) for article in articles
+            if arguments.tag is None or article.get_tag() == arguments.tag)
+    if arguments.limit is not None:
+        rows = (row for _, row in zip(range(arguments.limit), rows))
+    return rows
+
+
+def _search(library, arguments):
+    return (dict(article_row(article), Score=round(score, 4))
+            for article, score in library.search(arguments.query, arguments.top, arguments.tag, arguments.since,
+                                                 arguments.until))
+
+
+# the commands that compare articles reuse the words and similarities of the library's cache file
+def _load_cache(library, arguments):
+    from lets_alexandria.storage import get_cache_path
+    library.load_cache(get_cache_path(arguments.library))
+
+
+def _similar(library, arguments):
+    _load_cache(library, arguments)
+    article = library.get_article_by_name(arguments.title)
+    if article is None:
+        raise KeyError("Artigo não encontrado: " + arguments.title)
+    return [dict(article_row(other), Similarity=similarity)
+            for other, similarity in library.get_most_similar(article, arguments.top, tag=arguments.tag)]
+
+
+def _import(library, arguments):
+    if arguments.duplicates is not None:
+        library.enable_dedup(arguments.duplicates)
+    articles = library.import_articles(arguments.path, arguments.manifest, arguments.workers, arguments.pattern)
+    library.save(arguments.library)
+    return [article_row(article) for article in articles]
+
+
+# one row per article of every group of duplicates
+def _duplicates(library, arguments):
+    return (dict(article_row(article), Group=number)
+            for number, group in enumerate(library.find_duplicates(arguments.distance), 1) for article in group)
+
+
+def _report(library, arguments):
+    _load_cache(library, arguments)
+    if arguments.threshold is not None:
+        pairs = library.get_similar_pairs(threshold=arguments.threshold)
+    else:
+        pairs = library.get_similar_pairs(k=arguments.top)
+    return ({'Similarity': similarity, 'Title A': article_a.get_title(), 'Tag A': article_a.get_tag(),
+             'Title B': article_b.get_title(), 'Tag B': article_b.get_tag()}
+            for article_a, article_b, similarity in pairs)
+
+
+def _write_json(rows, output):
+    output.write('[')
+    for i, row in enumerate(rows):
+        output.write((',\n ' if i else '\n ') + json.dumps(row, ensure_ascii=False))
+    output.write('\n]\n')
+
+
+def _write_csv(rows, output):
+    import csv
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(output, fieldnames=list(row), lineterminator='\n')
+            writer.writeheader()
+        writer.writerow(row)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='main.py', description='Consultas ao Alexandria sem o menu interativo')
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--format', choices=['json', 'csv'], default='json', help='formato da saída (padrão: json)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('load', parents=[common], help='número de artigos por tema')
+    command.add_argument('library', help='arquivo .jsonl/.txt ou pasta .shards da biblioteca')
+    command.set_defaults(run=_load)
+
+    command = commands.add_parser('list', parents=[common], help='data, título e tema dos artigos, mais recentes primeiro')
+    command.add_argument('library')
+    command.add_argument('--since', type=_parse_date, help='data inicial (dd/mm/yyyy)')
+    command.add_argument('--until', type=_parse_date, help='data final (dd/mm/yyyy)')
+    command.add_argument('--tag')
+    command.add_argument('--limit', type=int)
+    command.set_defaults(run=_list)
+
+    command = commands.add_parser('search', parents=[common], help='busca por palavras no texto (frases entre aspas)')
+    command.add_argument('library')
+    command.add_argument('query')
+    command.add_argument('--top', type=int, default=10)
+    command.add_argument('--tag')
+    command.add_argument('--since', type=_parse_date)
+    command.add_argument('--until', type=_parse_date)
+    command.set_defaults(run=_search)
+
+    command = commands.add_parser('similar', parents=[common], help='artigos mais similares ao artigo com o título dado')
+    command.add_argument('library')
+    command.add_argument('title')
+    command.add_argument('--top', type=int, default=1)
+    command.add_argument('--tag')
+    command.set_defaults(run=_similar)
+
+    command = commands.add_parser('import', parents=[common], help='importa arquivos de texto e salva a biblioteca')
+    command.add_argument('library', help='criada se ainda não existir')
+    command.add_argument('path', help='pasta ou padrão glob')
+    command.add_argument('--manifest', help='manifesto CSV com File, Title, Tag e Date')
+    command.add_argument('--workers', type=int, default=8)
+    command.add_argument('--pattern', default='*.txt')
+    command.add_argument('--duplicates', choices=['reject', 'merge', 'flag'],
+                         help='o que fazer com artigos que duplicam outros (padrão: importar todos)')
+    command.set_defaults(run=_import, create=True)
+
+    command = commands.add_parser('duplicates', parents=[common], help='grupos de artigos duplicados ou quase')
+    command.add_argument('library')
+    command.add_argument('--distance', type=int, default=3, help='bits diferentes no SimHash (padrão: 3)')
+    command.set_defaults(run=_duplicates)
+
+    command = commands.add_parser('report', parents=[common], help='pares de artigos mais similares')
+    command.add_argument('library')
+    group = command.add_mutually_exclusive_group()
+    group.add_argument('--threshold', type=float, help='todos os pares com pelo menos esta similaridade')
+    group.add_argument('--top', type=int, default=20, help='os pares mais similares (padrão: 20)')
+    command.set_defaults(run=_report)
+    return parser
+
+
+def main(argv=None, output=None):
+    arguments = build_parser().parse_args(argv)
+    output = output or sys.stdout
+    try:
+        library = open_library(arguments.library, not getattr(arguments, 'create', False))
+        rows = arguments.run(library, arguments)
+        if arguments.format == 'csv':
+            _write_csv(rows, output)
+        else:
+            _write_json(rows, output)
+    except (FileNotFoundError, KeyError, ValueError) as e:
+        print(e.args[0] if e.args else e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,36 @@
+import bisect
 import datetime
-from ast import literal_eval
+import functools
+import hashlib
+import heapq
+import os
+import sys
+from lets_alexandria.dedup import POLICIES, DuplicateArticleError, SimHashIndex
+from lets_alexandria.instrumentation import instrumented
+from lets_alexandria.search import TextSearchIndex
+from lets_alexandria.similarity import LSHIndex, SimilarityCache, Vocabulary, WordIndex, jaccard_similarity, parallel_similarities, \
+    parallel_similarities_with, similar_pairs, sparse_similarities
+from lets_alexandria.storage import Journal, find_article_files, get_journal_path, is_jsonl, iter_journal, load_cache, \
+    load_jsonl, load_jsonl_metadata, load_legacy, read_article_files, read_journal_generation, save_cache, save_jsonl
+
+# articles published on the same day share one ordinal int instead of one each
+_ORDINALS = {}
+
 
 class Article:
+    # no per-instance __dict__ and as few slots as possible: a million articles cost a fraction of the memory
+    __slots__ = ('_observers', '_title', '_tag', '_date_ordinal', '_text', '_words', '_minhash')
+
     def __init__(self, title='', tag='', date : datetime = None, text='', filepath=None):
         
         #self.id = uuid.uuid4()
+        # None, the library's callback or, for an article in several libraries, a list of them
+        self._observers = None
         self.title = title
         self.tag = tag
+        self._words = None
+        # (MinHasher key, signature)
+        self._minhash = None
         
         if filepath is not None:
             with open(filepath, 'r') as file:
@@ -40,12 +64,124 @@ class Article:
             'Text': self.text}
         return str(answer)
 
+    # the record used by the library files, "Text" always comes last
+    def to_record(self):
+        return {
+            'Title': self.title,
+            'Tag': self.tag,
+            'Date': self.date.strftime("%d/%m/%Y"),
+            'Text': self.text}
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(record['Title'], record['Tag'], record['Date'], record['Text'])
+
+    # text_loader is called without arguments and gives the text
+    @classmethod
+    def from_lazy_record(cls, record, text_loader):
+        article = cls(record['Title'], record['Tag'], record['Date'], None)
+        article._text = text_loader
+        return article
+
+    def is_text_loaded(self):
+        return not callable(self._text)
+
+    # one line for listings, never loads the text of a lazy article
+    def get_summary(self):
+        return self.date.strftime("%d/%m/%Y") + ' | ' + self.title + ' | ' + self.tag
+
     def __eq__(self, o: object) -> bool:
         if isinstance(o, Article):
             if self.title == o.title and self.tag == o.tag and self.date == o.date and self.text == o.text:
                 return True
         return False
 
+    @property
+    def title(self):
+        return self._title
+
+    @title.setter
+    def title(self, title):
+        old_title = getattr(self, '_title', None)
+        self._title = title
+        self._notify('title', old_title)
+
+    @property
+    def tag(self):
+        return self._tag
+
+    # there are only a few subjects, so every article shares the same interned tag strings
+    @tag.setter
+    def tag(self, tag):
+        old_tag = getattr(self, '_tag', None)
+        self._tag = sys.intern(tag)
+        self._notify('tag', old_tag)
+
+    # the date is kept as its ordinal, a small int instead of a datetime.date object
+    @property
+    def date(self):
+        return datetime.date.fromordinal(self._date_ordinal)
+
+    @date.setter
+    def date(self, date):
+        old_date = getattr(self, '_date_ordinal', None)
+        ordinal = date.toordinal()
+        self._date_ordinal = _ORDINALS.setdefault(ordinal, ordinal)
+        if old_date is not None:
+            old_date = datetime.date.fromordinal(old_date)
+        self._notify('date', old_date)
+
+    def get_date_ordinal(self):
+        return self._date_ordinal
+
+    # the unique words are cached, so every text change has to drop them.
+    # lazily loaded articles keep the function that reads their text in its place, until it is needed
+    @property
+    def text(self):
+        text = self._text
+        if callable(text):
+            text = self._text = text()
+        return text
+
+    @text.setter
+    def text(self, text):
+        old_text = getattr(self, '_text', None)
+        if callable(old_text):
+            old_text = None
+        self._text = text
+        self._words = None
+        self._minhash = None
+        self._notify('text', old_text)
+
+    # a library registers itself here to keep its indexes up to date
+    def add_observer(self, callback):
+        if self._observers is None:
+            self._observers = callback
+        elif isinstance(self._observers, list):
+            self._observers.append(callback)
+        else:
+            self._observers = [self._observers, callback]
+
+    def remove_observer(self, callback):
+        if isinstance(self._observers, list):
+            self._observers.remove(callback)
+            if len(self._observers) == 1:
+                self._observers = self._observers[0]
+        elif self._observers == callback:
+            self._observers = None
+        else:
+            raise ValueError("Not an observer of the article")
+
+    def _notify(self, field, old_value):
+        observers = self._observers
+        if observers is None:
+            return
+        if isinstance(observers, list):
+            for callback in observers:
+                callback(self, field, old_value)
+        else:
+            observers(self, field, old_value)
+
     def set_text(self, text):
         self.text = text
     
@@ -56,7 +192,9 @@ class Article:
         self.tag = tag
     
     def set_date(self, date):
-        self.date = datetime.strptime(date, '%d/%m/%y').date()
+        if isinstance(date, str):
+            date = datetime.datetime.strptime(date, '%d/%m/%Y').date()
+        self.date = date
     
     def get_title(self):
         return self.title
@@ -72,35 +210,365 @@ class Article:
 
     def get_all(self):
         return self.title, self.tag, self.date, self.text
+
+    # the text is tokenized only once, on the first call after a change
+    def get_words(self):
+        words = self._words
+        if words is None:
+            words = self._words = set(self.text.split(' '))
+        return words
+
+    def get_word_count(self):
+        return len(self.get_words())
+
+    # unique words as a sorted array of the vocabulary's ids. Encoded on every call, the article only
+    # keeps its set of words
+    def get_token_ids(self, vocabulary):
+        return vocabulary.encode(self.get_words())
+
+    def get_minhash(self, minhasher):
+        key = minhasher.get_key()
+        if self._minhash is None or self._minhash[0] != key:
+            self._minhash = key, minhasher.signature(self.get_words())
+        return self._minhash[1]
     
+    # key of the article's derived data in a library cache file
+    def get_content_hash(self):
+        return hashlib.sha1((self.title + '\0' + self.text).encode('utf-8')).hexdigest()
+
+    # word ids and, if already computed, the MinHash signature, as saved by Library.save_cache
+    def get_derived_data(self, vocabulary):
+        data = {'Tokens': list(self.get_token_ids(vocabulary))}
+        if self._minhash is not None:
+            data['MinHashKey'] = list(self._minhash[0])
+            data['MinHash'] = self._minhash[1]
+        return data
+
+    # the other way around, with the words already decoded from the cached vocabulary
+    def set_derived_data(self, words, minhash=None, minhash_key=None):
+        self._words = set(words)
+        if minhash is not None:
+            self._minhash = tuple(minhash_key), tuple(minhash)
+
     def calculate_similarity(self, article):
-        answer = 0
-        f_set = set(self.text.split(' '))
-        s_set = set(article.text.split(' '))
+        common = len(self.get_words() & article.get_words())
+        return jaccard_similarity(common, self.get_word_count(), article.get_word_count())
+
 
-        for word in f_set:
-            if word in s_set:
-                answer += 1
-        return float("{:.4f}". format(answer/len(f_set.union(s_set))))
+# index: key -> {id(article): article}, the inner dicts keep the insertion order
+def _add_to_index(index, key, article):
+    articles = index.get(key)
+    if articles is None:
+        index[key] = {id(article): article}
+    else:
+        articles[id(article)] = article
+
+
+def _remove_from_index(index, key, article):
+    articles = index[key]
+    del articles[id(article)]
+    if not articles:
+        del index[key]
 
 
 class Library:
     def __init__(self, name, articles=None):
         self.name = name
-        self.articles = articles or []
+        # articles by id(), in insertion order, so removals don't have to search and shift a list
+        self._articles = {}
+        # the callback every article reports its changes to, one bound method shared by all of them
+        self._observer = self._article_changed
+        # title -> articles and tag -> articles, kept in sync with the articles' setters
+        self._titles = {}
+        self._tags = {}
+        # articles sorted by date (oldest first) and their date keys, so range queries can bisect,
+        # see _add_to_dates
+        self._dates = []
+        self._by_date = []
+        self._date_keys = {}
+        self._date_sequence = 0
+        # word ids shared by every article of the library
+        self.vocabulary = Vocabulary()
+        # built on the first similarity request and kept in sync afterwards
+        self._word_index = None
+        # similarity rows, built on the first calculate_(all_)similarities call and then kept up to date
+        self._similarity_cache = None
+        # ranked word search over the texts, built on the first search
+        self._search_index = None
+        # approximate neighbour search, only kept when enable_lsh is called
+        self._lsh_index = None
+        # duplicate detection on add, see enable_dedup, and the (article, original, distance) it flagged
+        self._dedup_index = None
+        self._dedup_policy = None
+        self._flagged_duplicates = []
+        # write-ahead journal of the snapshot in _snapshot_path, see open_journal
+        self._journal = None
+        self._snapshot_path = None
+        self._generation = 0
+        self._edited = False
+        # counts the adds, removals and edits, so save_cache can tell when its file is still up to date
+        self._changes = 0
+        self._cache_mark = None
+        self.add_articles(articles or [])
+
+    @property
+    def articles(self):
+        return list(self._articles.values())
+
+    # with duplicate detection enabled the article may be rejected or merged instead, see enable_dedup.
+    # loading a library doesn't check for duplicates, its articles were checked when first added.
+    # adding an article object the library already holds does nothing
+    @instrumented('add')
+    def add_article(self, article, check_duplicates=True):
+        if id(article) in self._articles:
+            return
+        if check_duplicates and self._dedup_index is not None and not self._admit(article):
+            return
+        self._register(article)
+        self._add_to_dates(article)
+
+    # the date index is merged once for the whole batch and the journal synced once at the end.
+    # gives the articles really added (duplicates rejected or merged are skipped, not raised)
+    @instrumented('add.batch')
+    def add_articles(self, articles, check_duplicates=True):
+        if check_duplicates and self._dedup_index is not None:
+            # one at a time: an article can duplicate, and be merged into, an earlier one of the batch
+            added = []
+            for article in articles:
+                if id(article) not in self._articles and self._admit(article, bulk=True):
+                    self._register(article)
+                    self._add_to_dates(article)
+                    added.append(article)
+        else:
+            added = []
+            for article in articles:
+                if id(article) not in self._articles:
+                    self._register(article)
+                    added.append(article)
+            self._merge_into_dates(added)
+        if self._journal is not None:
+            self._journal.sync()
+        return added
 
-    def add_article(self, article):
-        self.articles.append(article)
+    # reads the files of a directory (or a glob) with a pool of threads and adds them in one batch,
+    # see storage.read_article_files for where title, tag and date come from
+    @instrumented('import')
+    def import_articles(self, path, manifest=None, workers=8, pattern='*.txt'):
+        articles = [Article(metadata['Title'], metadata['Tag'], metadata['Date'], text)
+                    for metadata, text in read_article_files(find_article_files(path, pattern), manifest, workers)]
+        return self.add_articles(articles)
 
+    def _register(self, article):
+        self._changes += 1
+        self._articles[id(article)] = article
+        _add_to_index(self._titles, article.get_title(), article)
+        _add_to_index(self._tags, article.get_tag(), article)
+        article.add_observer(self._observer)
+        if self._journal is not None:
+            self._journal.append({'op': 'add', 'article': article.to_record()})
+        if self._word_index is not None:
+            self._word_index.add(article)
+        if self._similarity_cache is not None:
+            self._similarity_cache.add(article)
+        if self._search_index is not None:
+            self._search_index.add(article)
+        if self._lsh_index is not None:
+            self._lsh_index.add(article)
+        if self._dedup_index is not None:
+            self._dedup_index.add(article)
+
+    # reject raises DuplicateArticleError (bulk adds skip the article instead), merge keeps the article
+    # already there with the text and date of the newer of both, and flag lets the article in and
+    # records it. True when the article should be added
+    def _admit(self, article, bulk=False):
+        match = self._dedup_index.find(article.get_text())
+        if match is None:
+            return True
+        original, distance = match
+        if self._dedup_policy == 'flag':
+            self._flagged_duplicates.append((article, original, distance))
+            return True
+        if self._dedup_policy == 'merge':
+            if article.get_date() >= original.get_date():
+                if article.get_text() != original.get_text():
+                    original.set_text(article.get_text())
+                if article.get_date() != original.get_date():
+                    original.set_date(article.get_date())
+            return False
+        if bulk:
+            return False
+        raise DuplicateArticleError(article, original, distance)
+
+    @instrumented('remove.by_name')
     def remove_article_by_name(self, name):
-        for article in self.articles:
-            if article.get_title() == name:
-                self.articles.remove(article)
-                return True
-        return False
+        article = self.get_article_by_name(name)
+        if article is None:
+            return False
+        self._discard(article)
+        if self._journal is not None:
+            self._journal.append({'op': 'remove', 'title': name})
+        return True
     
+    # like list.remove, the first article equal to the given one is removed
+    @instrumented('remove')
     def remove_article(self, article):
-        self.articles.remove(article)
+        for candidate in self._titles.get(article.get_title(), {}).values():
+            if candidate == article:
+                self._discard(candidate)
+                if self._journal is not None:
+                    self._journal.append({'op': 'remove_article', 'article': article.to_record()})
+                return
+        raise ValueError("Article not in library")
+
+    def _discard(self, article):
+        self._changes += 1
+        del self._articles[id(article)]
+        _remove_from_index(self._titles, article.get_title(), article)
+        _remove_from_index(self._tags, article.get_tag(), article)
+        self._remove_from_dates(article)
+        article.remove_observer(self._observer)
+        if self._word_index is not None:
+            self._word_index.remove(article)
+        if self._similarity_cache is not None:
+            self._similarity_cache.remove(article)
+        if self._search_index is not None:
+            self._search_index.remove(article)
+        if self._lsh_index is not None:
+            self._lsh_index.remove(article)
+        if self._dedup_index is not None:
+            self._dedup_index.remove(article)
+            self._flagged_duplicates = [flagged for flagged in self._flagged_duplicates
+                                        if flagged[0] is not article and flagged[1] is not article]
+
+    def _article_changed(self, article, field, old_value):
+        # edits are not journaled, the next save writes a whole snapshot instead
+        self._edited = True
+        self._changes += 1
+        if field == 'title':
+            _remove_from_index(self._titles, old_value, article)
+            _add_to_index(self._titles, article.get_title(), article)
+            return
+        if field == 'tag':
+            _remove_from_index(self._tags, old_value, article)
+            _add_to_index(self._tags, article.get_tag(), article)
+            return
+        if field == 'date':
+            self._remove_from_dates(article)
+            self._add_to_dates(article)
+            return
+        if self._word_index is not None:
+            self._word_index.update(article)
+        if self._similarity_cache is not None:
+            self._similarity_cache.update(article)
+        if self._search_index is not None:
+            self._search_index.update(article, old_value)
+        if self._lsh_index is not None:
+            self._lsh_index.update(article)
+        if self._dedup_index is not None:
+            self._dedup_index.update(article)
+
+    # articles with the same date keep their insertion order: the keys are (date ordinal, sequence)
+    # pairs, so equal dates are ordered by the sequence and a removal bisects to the exact entry
+    def _get_date_key(self, article):
+        self._date_sequence += 1
+        key = (article.get_date_ordinal(), self._date_sequence)
+        self._date_keys[id(article)] = key
+        return key
+
+    def _add_to_dates(self, article):
+        key = self._get_date_key(article)
+        position = bisect.bisect_right(self._dates, key)
+        self._dates.insert(position, key)
+        self._by_date.insert(position, article)
+
+    def _merge_into_dates(self, articles):
+        new_articles = sorted(articles, key=lambda article: article.get_date_ordinal())
+        # the new keys come after the old ones, so on equal dates the articles already there stay first
+        merged = heapq.merge(zip(self._dates, self._by_date),
+                             ((self._get_date_key(article), article) for article in new_articles),
+                             key=lambda pair: pair[0])
+        self._dates = []
+        self._by_date = []
+        for key, article in merged:
+            self._dates.append(key)
+            self._by_date.append(article)
+
+    def _remove_from_dates(self, article):
+        position = bisect.bisect_left(self._dates, self._date_keys.pop(id(article)))
+        del self._dates[position]
+        del self._by_date[position]
+
+    # first position of the date index on or after the date ordinal
+    def _get_date_position(self, ordinal):
+        return bisect.bisect_left(self._dates, (ordinal,))
+
+    def enable_lsh(self, bands=16, rows=4, seed=1):
+        self._lsh_index = LSHIndex(bands, rows, seed)
+        for article in self.articles:
+            self._lsh_index.add(article)
+
+    def disable_lsh(self):
+        self._lsh_index = None
+
+    # from now on every added article is looked up among the others by text digest and by SimHash
+    # fingerprint (at most max_distance different bits), and a duplicate is handled by the policy:
+    # 'reject', 'merge' or 'flag' (see _admit)
+    def enable_dedup(self, policy='flag', max_distance=3):
+        if policy not in POLICIES:
+            raise ValueError("Unknown duplicate policy: " + str(policy))
+        self._dedup_policy = policy
+        self._dedup_index = SimHashIndex(max_distance)
+        self._flagged_duplicates = []
+        for article in self.articles:
+            self._dedup_index.add(article)
+
+    def disable_dedup(self):
+        self._dedup_index = None
+        self._dedup_policy = None
+        self._flagged_duplicates = []
+
+    def get_flagged_duplicates(self):
+        return list(self._flagged_duplicates)
+
+    # groups of articles that are exact or near duplicates of each other, the largest first. Only the
+    # articles sharing a digest or a fingerprint block are ever compared
+    @instrumented('dedup.report')
+    def find_duplicates(self, max_distance=3):
+        index = self._dedup_index
+        if index is None or index.max_distance != max_distance:
+            index = SimHashIndex(max_distance)
+            for article in self.articles:
+                index.add(article)
+        return index.get_groups()
+
+    def _get_token_ids(self):
+        return [article.get_token_ids(self.vocabulary) for article in self._articles.values()]
+
+    def _get_word_index(self):
+        if self._word_index is None:
+            self._word_index = WordIndex(self.articles)
+        return self._word_index
+
+    # with every row, see SimilarityCache
+    def _get_similarity_cache(self):
+        if self._similarity_cache is None or not self._similarity_cache.complete:
+            self._similarity_cache = SimilarityCache(self._get_word_index(), self.articles)
+        return self._similarity_cache
+
+    def _contains(self, article):
+        return self._articles.get(id(article)) is article
+
+    # similarity of any article with the given one, read from the cache when it has the article's row
+    def _get_similarity_function(self, article):
+        if self._similarity_cache is None or not self._contains(article):
+            return article.calculate_similarity
+        row = self._similarity_cache.get_row(article)
+
+        def cached_similarity(other):
+            if other is article:
+                return 1.0
+            return row.get(id(other), 0.0)
+        return cached_similarity
     
     def __str__(self):
         answer = {'Library': self.name, 'Articles': self.articles}
@@ -122,68 +590,326 @@ class Library:
     def get_name(self):
         return self.name
     
+    @instrumented('lookup.by_name')
     def get_article_by_name(self, name):
-        for article in self.articles:
-            if article.get_title() == name:
-                return article
-        return None
+        articles = self._titles.get(name)
+        if not articles:
+            return None
+        return next(iter(articles.values()))
 
+    @instrumented('lookup.by_tag')
     def get_articles_by_tag(self, tag):
-        answer = []
-        for article in self.articles:
-            if tag == article.get_tag():
-                answer.append(article)
-        return answer
+        return list(self._tags.get(tag, {}).values())
+
+    # the iter_ versions give the same articles as the get_ ones one at a time, without copying the indexes
+    def iter_articles_by_tag(self, tag):
+        return iter(self._tags.get(tag, {}).values())
 
+    # BM25-ranked word search, quoted phrases must appear as they are. The results can be restricted to
+    # a tag and to a date range, and come out best first from a generator
+    @instrumented('lookup.words')
+    def search(self, query, k=10, tag=None, since=None, until=None):
+        if self._search_index is None:
+            self._search_index = TextSearchIndex(self._articles.values())
+        first_day = since.toordinal() if since is not None else None
+        last_day = until.toordinal() if until is not None else None
+
+        def keep(article):
+            return ((tag is None or article.get_tag() == tag)
+                    and (first_day is None or article.get_date_ordinal() >= first_day)
+                    and (last_day is None or article.get_date_ordinal() <= last_day))
+        return self._search_index.search(query, k, keep)
+
+    # articles published on or after the date, oldest first
+    @instrumented('lookup.by_date')
     def get_articles_by_date(self, date):
-        answer = []
-        for article in self.articles:
-            if article.get_date() >= date:
-                answer.append(article)
-        return answer
+        return self._by_date[self._get_date_position(date.toordinal()):]
+
+    # articles published between both dates (inclusive), oldest first
+    @instrumented('lookup.between_dates')
+    def get_articles_between(self, start, end):
+        return self._by_date[self._get_date_position(start.toordinal()):self._get_date_position(end.toordinal() + 1)]
+
+    def iter_articles_by_date(self, date):
+        start = self._get_date_position(date.toordinal())
+        return map(self._by_date.__getitem__, range(start, len(self._by_date)))
+
+    def iter_articles_between(self, start, end):
+        return map(self._by_date.__getitem__, range(self._get_date_position(start.toordinal()),
+                                                     self._get_date_position(end.toordinal() + 1)))
 
     # gives the most recent articles first
+    @instrumented('list.sorted')
     def get_articles_sorted(self):
-        self.articles.sort(key=lambda x: x.get_date())
-        return self.articles[::-1]
+        return self._by_date[::-1]
+
+    # same order as get_articles_sorted, without copying the library
+    def iter_articles_sorted(self):
+        return reversed(self._by_date)
         
-    def load(self, file_name):
-        with open(file_name, 'r') as file:
-            proto_library = literal_eval(file.read())
-            try:
-                self.name = proto_library['Library']
-                self.articles = []
-                for article in proto_library['Articles']:
-                    self.articles.append(Article(article['Title'], article['Tag'], article['Date'], article['Text']))
-            except:
-                print('Error loading Library!')
+    # .jsonl files are streamed one article at a time, anything else is read in the old repr() format.
+    # lazy .jsonl loads keep only title, tag and date, the texts are read from the file when needed.
+    # the changes left in the journal of a .jsonl library are replayed on top of it.
+    # a file that can't be read prints an error, or raises it when strict
+    @instrumented('load')
+    def load(self, file_name, lazy=False, strict=False):
+        self.close_journal()
+        try:
+            if lazy and is_jsonl(file_name):
+                self._load_metadata(file_name)
+            else:
+                if is_jsonl(file_name):
+                    header, records = load_jsonl(file_name)
+                else:
+                    header, records = load_legacy(file_name)
+                self._load_header(header)
+                self.add_articles((Article.from_record(record) for record in records), check_duplicates=False)
+            if is_jsonl(file_name):
+                self._replay_journal(get_journal_path(file_name))
+        except (KeyError, TypeError, ValueError):
+            if strict:
+                raise
+            print('Error loading Library!')
             
+    def _load_metadata(self, file_name):
+        header, store, items = load_jsonl_metadata(file_name)
+        self._load_header(header)
+        self.add_articles((Article.from_lazy_record(metadata, functools.partial(store.read_text, start, end))
+                           for metadata, start, end in items), check_duplicates=False)
+
+    def _load_header(self, header):
+        self.name = header['Library']
+        self._generation = header.get('Generation', 0)
+        self.clear()
+        self._edited = False
+
+    # a journal written for an older snapshot is already part of this one
+    def _replay_journal(self, journal_path):
+        if not os.path.isfile(journal_path) or read_journal_generation(journal_path) != self._generation:
+            return
+        for record in iter_journal(journal_path):
+            if record['op'] == 'add':
+                self.add_article(Article.from_record(record['article']), check_duplicates=False)
+            elif record['op'] == 'remove':
+                self.remove_article_by_name(record['title'])
+            elif record['op'] == 'remove_article':
+                self.remove_article(Article.from_record(record['article']))
+
+    # from now on add_article and the removals are appended to <filepath>.journal, and saving
+    # to filepath only has to sync it, until an edit or compact() writes a new snapshot. A save also
+    # writes a new snapshot once the journal holds compact_after records
+    def open_journal(self, filepath, batch_size=32, compact_after=1000):
+        if not is_jsonl(filepath):
+            raise ValueError("Only .jsonl libraries can have a journal")
+        self.close_journal()
+        self._journal = Journal(get_journal_path(filepath), self._generation, batch_size, compact_after)
+        self._snapshot_path = filepath
+
+    def close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = None
+        self._snapshot_path = None
+
+    # forgets the changes made since the last save (on disk, the library in memory keeps them)
+    def discard_journal(self):
+        if self._journal is not None:
+            self._journal.discard()
+
+    @instrumented('save.compact')
+    def compact(self):
+        self._save_snapshot(self._snapshot_path)
+
+    # the journal can't record a clear, so the next save writes a whole snapshot
+    def clear(self):
+        self._edited = True
+        for article in self._articles.values():
+            article.remove_observer(self._observer)
+        self._articles = {}
+        self._titles = {}
+        self._tags = {}
+        self._dates = []
+        self._by_date = []
+        self._date_keys = {}
+        self.vocabulary = Vocabulary()
+        self._word_index = None
+        self._similarity_cache = None
+        self._search_index = None
+        if self._lsh_index is not None:
+            self.enable_lsh(self._lsh_index.bands, self._lsh_index.rows, self._lsh_index.minhasher.seed)
+        if self._dedup_index is not None:
+            self.enable_dedup(self._dedup_policy, self._dedup_index.max_distance)
+
     def set_name(self, name):
         self.name = name
 
+    # what the cache file holds when it matches the library: the library's articles as they are,
+    # whether it has every similarity row and whether it has the MinHash signatures
+    def _get_cache_mark(self, filepath):
+        return (filepath, self._changes, self._similarity_cache is not None and self._similarity_cache.complete,
+                self._lsh_index is not None)
+
+    # keeps the derived data of every article (word ids, MinHash signatures and, when they have all
+    # been computed, the similarity rows) in a file next to the library, keyed by a digest of title and
+    # text. The similarities (4 places) are kept as integers. Nothing is written when the file already
+    # matches the library (see load_cache), gives whether it was written
+    @instrumented('save.cache')
+    def save_cache(self, filepath):
+        if self._cache_mark == self._get_cache_mark(filepath):
+            return False
+        articles = self.articles
+        position = {id(article): i for i, article in enumerate(articles)}
+        # ids numbered again over the current articles only, the words of removed or edited articles
+        # would make the file grow session after session
+        vocabulary = Vocabulary()
+        entries = []
+        for article in articles:
+            entry = article.get_derived_data(vocabulary)
+            entry['Hash'] = article.get_content_hash()
+            if self._similarity_cache is not None and self._similarity_cache.complete:
+                row = self._similarity_cache.get_row(article)
+                entry['Neighbours'] = [position[other] for other in row]
+                entry['Scores'] = [round(similarity * 10000) for similarity in row.values()]
+            entries.append(entry)
+        save_cache(filepath, vocabulary.words, entries)
+        self._cache_mark = self._get_cache_mark(filepath)
+        return True
+
+    # the articles whose title and text still match an entry of the file get their derived data back,
+    # and the similarity rows between them are reused, so only changed and new articles are tokenized
+    # and scored again. Gives how many articles were matched. Digesting the texts reads them, so lazily
+    # loaded articles stop being lazy
+    @instrumented('load.cache')
+    def load_cache(self, filepath):
+        cache = load_cache(filepath)
+        if cache is None:
+            return 0
+        words = cache['Vocabulary']
+        unmatched = {}
+        for article in self.articles:
+            unmatched.setdefault(article.get_content_hash(), article)
+        matched = {}
+        for position, entry in enumerate(cache['Articles']):
+            article = unmatched.pop(entry['Hash'], None)
+            if article is None:
+                continue
+            article.set_derived_data([words[word_id] for word_id in entry['Tokens']], entry.get('MinHash'),
+                                     entry.get('MinHashKey'))
+            matched[position] = article
+        if matched and (self._similarity_cache is None or not self._similarity_cache.complete) and all('Neighbours' in entry for entry in cache['Articles']):
+            # the neighbours that were not matched all end up under None
+            keys = [None] * len(cache['Articles'])
+            for position, article in matched.items():
+                keys[position] = id(article)
+            rows = {}
+            for position, article in matched.items():
+                entry = cache['Articles'][position]
+                row = dict(zip(map(keys.__getitem__, entry['Neighbours']), [score / 10000 for score in entry['Scores']]))
+                row.pop(None, None)
+                rows[id(article)] = row
+            self._similarity_cache = SimilarityCache(self._get_word_index(), self.articles, rows)
+        if len(matched) == len(cache['Articles']) == len(self._articles):
+            self._cache_mark = self._get_cache_mark(filepath)
+        return len(matched)
+
+    @instrumented('save')
     def save(self, filepath):
-        with open(filepath, 'w') as file:
-            file.write(self.__repr__())
+        if self._journal is not None and filepath == self._snapshot_path and not self._edited and \
+                self._journal.records < self._journal.compact_after:
+            self._journal.commit()
+            return
+        self._save_snapshot(filepath)
+
+    def _save_snapshot(self, filepath):
+        if not is_jsonl(filepath):
+            with open(filepath, 'w') as file:
+                file.write(self.__repr__())
+            return
+        self._generation += 1
+        save_jsonl(filepath, self.name, (article.to_record() for article in self._articles.values()),
+                   self._generation)
+        self._edited = False
+        if self._journal is None:
+            return
+        if filepath != self._snapshot_path:
+            # saved somewhere else: the old snapshot still needs the records saved to its journal, only
+            # the ones never saved there are dropped
+            self._journal.discard()
+            self.open_journal(filepath, self._journal.batch_size, self._journal.compact_after)
+        # the journal is folded into this snapshot
+        self._journal.reset(self._generation)
     
-    def calculate_similarities(self, article):
+    # read from the similarity cache when the article belongs to the library (only the article's row
+    # is scored when it is not there yet), with workers the articles are split in row blocks and scored
+    # by a process pool
+    @instrumented('similarity.row')
+    def calculate_similarities(self, article, workers=None, chunk_size=None):
+        if workers is not None:
+            return parallel_similarities_with(self._get_token_ids(), article.get_token_ids(self.vocabulary),
+                                              workers, chunk_size)
+        if self._contains(article) and self._similarity_cache is None:
+            self._similarity_cache = SimilarityCache(self._get_word_index())
+        similarity = self._get_similarity_function(article)
         answer = []
-        for a in self.articles:
-            answer.append(a.calculate_similarity(article))
+        for a in self._articles.values():
+            answer.append(similarity(a))
         return answer
 
-    def calculate_all_similarities (self):
-        answer = []
-        for a in self.articles:
-            answer.append(self.calculate_similarities(a))
-        return answer
+    # pairs without any word in common are never visited and stay at 0.0.
+    # the 'sparse' backend (numpy + scipy) can also answer with a dense array or a sparse top-k matrix,
+    # the 'parallel' backend spreads row blocks of chunk_size articles over a pool of worker processes
+    @instrumented('similarity.all')
+    def calculate_all_similarities (self, backend='index', output='list', k=10, workers=None, chunk_size=None):
+        if backend == 'sparse':
+            token_ids = self._get_token_ids()
+            return sparse_similarities(token_ids, len(self.vocabulary), output, k)
+        if backend not in ('index', 'parallel'):
+            raise ValueError("Unknown backend: " + str(backend))
+        if output != 'list':
+            raise ValueError("The " + backend + " backend only answers with lists")
+        if backend == 'parallel':
+            return parallel_similarities(self._get_token_ids(), workers, chunk_size)
+        return self._get_similarity_cache().to_matrix(self.articles)
 
-    
+
+    # scores every candidate once and keeps only the k best ones in a bounded heap
+    def _rank_similar(self, article, k, candidates=None):
+        if candidates is None:
+            candidates = enumerate(self._articles.values())
+        similarity = self._get_similarity_function(article)
+        scored = ((index, other, similarity(other)) for index, other in candidates if other is not article)
+        return heapq.nlargest(k, scored, key=lambda candidate: candidate[2])
+
+    # with LSH enabled only the articles sharing a bucket are scored, unless exact is asked.
+    # with a tag only the articles of that tag are candidates
+    @instrumented('similarity.most_similar')
+    def get_most_similar(self, article, k=1, exact=False, tag=None):
+        candidates = None
+        if self._lsh_index is not None and not exact:
+            candidates = ((None, other) for other in self._lsh_index.get_candidates(article)
+                          if tag is None or other.get_tag() == tag)
+        elif tag is not None:
+            candidates = ((None, other) for other in self._tags.get(tag, {}).values())
+        return [(other, similarity) for _, other, similarity in self._rank_similar(article, k, candidates)]
+
+    @instrumented('similarity.greatest')
     def get_greatest_similarity(self, article):
-        answer = []
-        temp_articles = self.articles.copy()
-        temp_articles.sort(key=lambda x: x.calculate_similarity(article))
-        return self.articles.index(temp_articles[-2]), temp_articles[-2].calculate_similarity(article)
+        best = self._rank_similar(article, 1)
+        if not best:
+            return None
+        index, _, similarity = best[0]
+        return index, similarity
 
+    # (article, article, similarity) for every pair at or above the threshold, or for the k most similar
+    # pairs, most similar first. Most pairs are never compared, see similarity.similar_pairs
+    @instrumented('similarity.pairs')
+    def get_similar_pairs(self, threshold=None, k=None):
+        articles = self.articles
+        pairs = similar_pairs([article.get_words() for article in articles], threshold, k)
+        return [(articles[i], articles[j], similarity) for i, j, similarity in pairs]
 
     def get_article_by_greatest_similarity(self, article):
-        return self.articles[self.get_greatest_similarity(article)[0]]
+        best = self.get_most_similar(article, 1)
+        if not best:
+            return None
+        return best[0][0]
@@ -0,0 +1,150 @@
+import functools
+import hashlib
+from collections import Counter
+from lets_alexandria.search import tokenize
+
+# what Library does with an article that duplicates one already there, see Library.enable_dedup:
+# reject raises DuplicateArticleError (bulk adds skip the article), merge gives the newer text and date
+# to the article already there, and flag adds the article anyway and records the pair
+POLICIES = ('reject', 'merge', 'flag')
+
+SIMHASH_BITS = 64
+
+
+class DuplicateArticleError(ValueError):
+    def __init__(self, article, original, distance):
+        super().__init__("Duplicate of " + repr(original.get_title()) + " (distance " + str(distance) + ")")
+        self.article = article
+        self.original = original
+        self.distance = distance
+
+
+# the same text, ignoring case and spacing
+def text_digest(text):
+    return hashlib.sha1(' '.join(text.lower().split()).encode('utf-8')).hexdigest()
+
+
+# the positions of the bits set in the word's 64-bit hash
+@functools.lru_cache(maxsize=1 << 16)
+def _word_bits(word):
+    word_hash = int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest(), 'big')
+    return tuple(bit for bit in range(SIMHASH_BITS) if word_hash >> bit & 1)
+
+
+# 64-bit fingerprint where every bit is the vote of the words' hashes weighted by how often the word
+# appears, so texts that differ in a few words differ in a few bits
+def simhash(text):
+    counts = Counter(tokenize(text))
+    votes = [0] * SIMHASH_BITS
+    for word, count in counts.items():
+        for bit in _word_bits(word):
+            votes[bit] += count
+    total = sum(counts.values())
+    fingerprint = 0
+    for bit, vote in enumerate(votes):
+        if 2 * vote > total:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+# exact digests plus the fingerprints split in max_distance + 1 blocks, one table per block: two
+# fingerprints at most max_distance bits apart agree on at least one whole block, so a lookup only
+# compares the articles sharing one of its blocks
+class SimHashIndex:
+    def __init__(self, max_distance=3):
+        self.max_distance = max_distance
+        blocks = max_distance + 1
+        self.blocks = [(SIMHASH_BITS * i // blocks, SIMHASH_BITS * (i + 1) // blocks) for i in range(blocks)]
+        self.tables = [{} for _ in self.blocks]
+        self.digests = {}
+        # id(article) -> (article, digest, fingerprint), so removals never read the text again
+        self.entries = {}
+
+    def _get_block_keys(self, fingerprint):
+        return [fingerprint >> start & ((1 << (end - start)) - 1) for start, end in self.blocks]
+
+    def add(self, article):
+        key = id(article)
+        if key in self.entries:
+            return
+        text = article.get_text()
+        digest = text_digest(text)
+        fingerprint = simhash(text)
+        self.entries[key] = (article, digest, fingerprint)
+        self.digests.setdefault(digest, {})[key] = article
+        for table, block_key in zip(self.tables, self._get_block_keys(fingerprint)):
+            table.setdefault(block_key, {})[key] = article
+
+    def remove(self, article):
+        entry = self.entries.pop(id(article), None)
+        if entry is None:
+            return
+        _, digest, fingerprint = entry
+        _discard(self.digests, digest, id(article))
+        for table, block_key in zip(self.tables, self._get_block_keys(fingerprint)):
+            _discard(table, block_key, id(article))
+
+    def update(self, article):
+        self.remove(article)
+        self.add(article)
+
+    # the closest indexed article to the text and its distance (0 for the same text), or None
+    def find(self, text, exclude=None):
+        exact = self.digests.get(text_digest(text), {})
+        for key, article in exact.items():
+            if key != exclude:
+                return article, 0
+        fingerprint = simhash(text)
+        best = None
+        for table, block_key in zip(self.tables, self._get_block_keys(fingerprint)):
+            for key, article in table.get(block_key, {}).items():
+                if key == exclude:
+                    continue
+                distance = hamming_distance(fingerprint, self.entries[key][2])
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = article, distance
+        return best
+
+    # groups of indexed articles linked by exact or near duplicates (union-find over the table
+    # collisions), in insertion order, the largest groups first
+    def get_groups(self):
+        parent = {key: key for key in self.entries}
+
+        def find_root(key):
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        def union(a, b):
+            a, b = find_root(a), find_root(b)
+            if a != b:
+                parent[b] = a
+
+        for bucket in self.digests.values():
+            first = next(iter(bucket))
+            for key in bucket:
+                union(first, key)
+        for table in self.tables:
+            for bucket in table.values():
+                keys = list(bucket)
+                for i, a in enumerate(keys):
+                    for b in keys[i + 1:]:
+                        if find_root(a) != find_root(b) and \
+                                hamming_distance(self.entries[a][2], self.entries[b][2]) <= self.max_distance:
+                            union(a, b)
+        groups = {}
+        for key, (article, _, _) in self.entries.items():
+            groups.setdefault(find_root(key), []).append(article)
+        return sorted((group for group in groups.values() if len(group) > 1), key=len, reverse=True)
+
+
+def _discard(table, key, article_key):
+    bucket = table[key]
+    del bucket[article_key]
+    if not bucket:
+        del table[key]
@@ -0,0 +1,156 @@
+import contextlib
+import functools
+import json
+import time
+import types
+
+# how many latencies are kept per operation for the percentiles
+MAX_SAMPLES = 10000
+
+
+class OperationStats:
+    def __init__(self):
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.items = 0
+        self.latencies = []
+
+    def record(self, seconds, items):
+        self.calls += 1
+        self.total_seconds += seconds
+        self.items += items
+        if len(self.latencies) < MAX_SAMPLES:
+            self.latencies.append(seconds)
+        else:
+            # keeps the most recent samples
+            self.latencies[self.calls % MAX_SAMPLES] = seconds
+
+    def percentile(self, fraction):
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'total_seconds': self.total_seconds,
+            'mean_seconds': self.total_seconds / self.calls,
+            'p50_seconds': self.percentile(0.5),
+            'p90_seconds': self.percentile(0.9),
+            'p99_seconds': self.percentile(0.99),
+            'items': self.items}
+
+
+# opt-in: while disabled, every instrumented call only pays for one attribute check
+class Instrumentation:
+    def __init__(self):
+        self.enabled = False
+        self.operations = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.operations = {}
+
+    def record(self, name, seconds, items=0):
+        stats = self.operations.get(name)
+        if stats is None:
+            stats = self.operations[name] = OperationStats()
+        stats.record(seconds, items)
+
+    @contextlib.contextmanager
+    def _measure(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def measure(self, name):
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._measure(name)
+
+    def get_stats(self):
+        return {name: stats.to_dict() for name, stats in sorted(self.operations.items())}
+
+    def report(self):
+        lines = ['{:<32} {:>8} {:>12} {:>12} {:>12} {:>10}'.format(
+            'operação', 'chamadas', 'total (s)', 'p50 (ms)', 'p99 (ms)', 'itens')]
+        for name, stats in self.get_stats().items():
+            lines.append('{:<32} {:>8} {:>12.4f} {:>12.3f} {:>12.3f} {:>10}'.format(
+                name, stats['calls'], stats['total_seconds'], stats['p50_seconds'] * 1000,
+                stats['p99_seconds'] * 1000, stats['items']))
+        return '\n'.join(lines)
+
+    def dump(self, filepath):
+        with open(filepath, 'w') as file:
+            json.dump(self.get_stats(), file, indent=2)
+
+
+INSTRUMENTATION = Instrumentation()
+
+
+def _count_items(result):
+    if isinstance(result, (list, tuple, dict, set)):
+        return len(result)
+    return 0 if result is None else 1
+
+
+# the time spent producing the items of a generator (not the caller's time between them) is added to
+# the call's, and recorded with the number of items once the generator is exhausted or closed
+def _measure_generator(name, generator, seconds):
+    items = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(generator)
+            except StopIteration:
+                return
+            finally:
+                seconds += time.perf_counter() - start
+            items += 1
+            yield item
+    finally:
+        INSTRUMENTATION.record(name, seconds, items)
+
+
+# records the call count, latency and number of returned items of the decorated function. For
+# functions that return a generator the record covers consuming it, see _measure_generator
+def instrumented(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not INSTRUMENTATION.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except BaseException:
+                INSTRUMENTATION.record(name, time.perf_counter() - start)
+                raise
+            if isinstance(result, types.GeneratorType):
+                return _measure_generator(name, result, time.perf_counter() - start)
+            INSTRUMENTATION.record(name, time.perf_counter() - start, _count_items(result))
+            return result
+        return wrapper
+    return decorator
+
+
+# runs a single operation under cProfile, gives its result and the most expensive calls as text.
+# the profiler modules are only imported here, they are slow to import and rarely needed
+def profile_operation(function, *args, output=None, limit=20, **kwargs):
+    import cProfile
+    import io
+    import pstats
+    profiler = cProfile.Profile()
+    result = profiler.runcall(function, *args, **kwargs)
+    if output is not None:
+        profiler.dump_stats(output)
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(limit)
+    return result, text.getvalue()
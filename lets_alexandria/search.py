@@ -0,0 +1,102 @@
+import heapq
+import math
+import re
+from collections import Counter
+
+WORD_PATTERN = re.compile(r'\w+')
+PHRASE_PATTERN = re.compile(r'"([^"]*)"')
+
+
+# search words ignore case and punctuation, unlike the similarity words
+def tokenize(text):
+    return WORD_PATTERN.findall(text.lower())
+
+
+def _contains_phrase(tokens, phrase):
+    size = len(phrase)
+    return any(tokens[i:i + size] == phrase for i in range(len(tokens) - size + 1) if tokens[i] == phrase[0])
+
+
+# term -> {id(article): term frequency} postings, ranked with BM25
+class TextSearchIndex:
+    def __init__(self, articles=(), k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.lengths = {}
+        self.articles = {}
+        self.total_length = 0
+        for article in articles:
+            self.add(article)
+
+    def add(self, article):
+        key = id(article)
+        if key in self.articles:
+            return
+        tokens = tokenize(article.get_text())
+        self.articles[key] = article
+        self.lengths[key] = len(tokens)
+        self.total_length += len(tokens)
+        for term, frequency in Counter(tokens).items():
+            posting = self.postings.get(term)
+            if posting is None:
+                self.postings[term] = {key: frequency}
+            else:
+                posting[key] = frequency
+
+    # the article's terms are found again from its text, so this has to run before the text changes
+    # in the index, see update
+    def remove(self, article, text=None):
+        key = id(article)
+        if key not in self.articles:
+            return
+        del self.articles[key]
+        self.total_length -= self.lengths.pop(key)
+        for term in set(tokenize(article.get_text() if text is None else text)):
+            posting = self.postings[term]
+            del posting[key]
+            if not posting:
+                del self.postings[term]
+
+    def update(self, article, old_text):
+        self.remove(article, old_text)
+        self.add(article)
+
+    def _idf(self, term):
+        frequency = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.articles) - frequency + 0.5) / (frequency + 0.5))
+
+    # words are optional (any of them is enough), quoted phrases are required. Only the articles in
+    # the postings of the query terms are looked at, keep(article) can filter them before scoring
+    def search(self, query, k=10, keep=None):
+        phrases = [tokenize(phrase) for phrase in PHRASE_PATTERN.findall(query)]
+        phrases = [phrase for phrase in phrases if phrase]
+        terms = set(tokenize(PHRASE_PATTERN.sub(' ', query)))
+        for phrase in phrases:
+            terms.update(phrase)
+        if not terms or not self.articles:
+            return
+
+        if phrases:
+            required = set.intersection(*(set(self.postings.get(term, ())) for phrase in phrases for term in phrase))
+        else:
+            required = None
+        average_length = self.total_length / len(self.articles)
+        scores = Counter()
+        for term in terms:
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = self._idf(term)
+            for key, frequency in posting.items():
+                if required is not None and key not in required:
+                    continue
+                normalization = self.k1 * (1 - self.b + self.b * self.lengths[key] / average_length)
+                scores[key] += idf * frequency * (self.k1 + 1) / (frequency + normalization)
+
+        candidates = ((self.articles[key], score) for key, score in scores.items()
+                      if keep is None or keep(self.articles[key]))
+        if phrases:
+            candidates = ((article, score) for article, score in candidates
+                          if all(_contains_phrase(tokenize(article.get_text()), phrase) for phrase in phrases))
+        yield from heapq.nlargest(k, candidates, key=lambda candidate: candidate[1])
@@ -0,0 +1,315 @@
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from lets_alexandria.cli import article_row, open_library
+from lets_alexandria.core_entities import Article
+
+# one Library in memory shared by every client. The protocol is JSON Lines over a local TCP port or a
+# Unix socket: each request is an object with an "op" and its arguments, each answer
+# {"ok": true, "result": ...} or {"ok": false, "error": message}. Reads run concurrently in a pool of
+# threads, writes one at a time with no read running (see ReadWriteLock)
+
+
+# many readers or a single writer. A waiting writer stops new readers from coming in, so a steady
+# stream of queries cannot keep the writes waiting forever
+class ReadWriteLock:
+    def __init__(self):
+        self._condition = asyncio.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextlib.asynccontextmanager
+    async def reading(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: not self._writing and not self._waiting_writers)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def writing(self):
+        async with self._condition:
+            self._waiting_writers += 1
+            try:
+                await self._condition.wait_for(lambda: not self._writing and not self._readers)
+            finally:
+                self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+def _parse_date(text):
+    if text is None:
+        return None
+    return datetime.datetime.strptime(text, '%d/%m/%Y').date()
+
+
+def _get_article(library, request):
+    article = library.get_article_by_name(request['title'])
+    if article is None:
+        raise KeyError("Artigo não encontrado: " + request['title'])
+    return article
+
+
+def _get(library, request):
+    return _get_article(library, request).to_record()
+
+
+def _list(library, request):
+    since = _parse_date(request.get('since')) or datetime.date.min
+    until = _parse_date(request.get('until')) or datetime.date.max
+    tag = request.get('tag')
+    rows = [article_row(article) for article in reversed(library.get_articles_between(since, until))
+            if tag is None or article.get_tag() == tag]
+    return rows[:request.get('limit')]
+
+
+def _search(library, request):
+    return [dict(article_row(article), Score=round(score, 4))
+            for article, score in library.search(request['query'], request.get('k', 10), request.get('tag'),
+                                                 _parse_date(request.get('since')), _parse_date(request.get('until')))]
+
+
+def _similar(library, request):
+    article = _get_article(library, request)
+    return [dict(article_row(other), Similarity=similarity)
+            for other, similarity in library.get_most_similar(article, request.get('k', 1), tag=request.get('tag'))]
+
+
+def _count(library, request):
+    return len(library.get_articles())
+
+
+def _add(library, request):
+    library.add_article(Article.from_record(request['article']))
+    return len(library.get_articles())
+
+
+def _remove(library, request):
+    return library.remove_article_by_name(request['title'])
+
+
+# what the library builds on first use (the shards of a .shards directory, the search index, the word
+# sets of the articles with the index over them) is built before the first client, so concurrent reads
+# never build it at the same time
+def _prepare(library):
+    library.get_articles()
+    library.search('', 0)
+    library._get_word_index()
+
+
+READS = {'get': _get, 'list': _list, 'search': _search, 'similar': _similar, 'count': _count}
+WRITES = {'add': _add, 'remove': _remove}
+
+
+class LibraryServer:
+    def __init__(self, filepath, workers=4):
+        self.filepath = filepath
+        self.library = open_library(filepath)
+        # a .jsonl library journals the writes between saves, like the interactive interface
+        if filepath.endswith('.jsonl'):
+            self.library.open_journal(filepath)
+        _prepare(self.library)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.lock = None
+        self.server = None
+
+    # gives the address the clients connect to: the socket path, or (host, port) when no path is given
+    # (port 0 picks a free port)
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        self.lock = ReadWriteLock()
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self._serve_client, path=path)
+            return path
+        self.server = await asyncio.start_server(self._serve_client, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.pool.shutdown()
+        self.library.close_journal()
+
+    async def _serve_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self.execute(line)
+                writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def execute(self, line):
+        try:
+            request = json.loads(line)
+            operation = request['op']
+            loop = asyncio.get_running_loop()
+            if operation in READS:
+                async with self.lock.reading():
+                    result = await loop.run_in_executor(self.pool, READS[operation], self.library, request)
+            elif operation in WRITES:
+                async with self.lock.writing():
+                    result = await loop.run_in_executor(self.pool, WRITES[operation], self.library, request)
+            elif operation == 'save':
+                async with self.lock.writing():
+                    result = await loop.run_in_executor(self.pool, self.library.save, self.filepath)
+            else:
+                raise ValueError("Operação desconhecida: " + str(operation))
+        except (KeyError, TypeError, ValueError) as e:
+            return {'ok': False, 'error': str(e.args[0] if e.args else e)}
+        # any other failure is answered too, the connection stays open for the next request
+        except Exception as e:
+            return {'ok': False, 'error': type(e).__name__ + ': ' + str(e)}
+        return {'ok': True, 'result': result}
+
+
+class ServerError(Exception):
+    pass
+
+
+# blocking client, one request at a time over a single connection. address is what
+# LibraryServer.start gave: a (host, port) pair or a Unix socket path
+class LibraryClient:
+    def __init__(self, address):
+        if isinstance(address, str):
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.connect(address if isinstance(address, str) else tuple(address))
+        self.file = self.socket.makefile('rwb')
+
+    def request(self, op, **arguments):
+        arguments['op'] = op
+        self.file.write(json.dumps(arguments, ensure_ascii=False).encode('utf-8') + b'\n')
+        self.file.flush()
+        response = json.loads(self.file.readline())
+        if not response['ok']:
+            raise ServerError(response['error'])
+        return response['result']
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+async def _open_connection(address):
+    if isinstance(address, str):
+        return await asyncio.open_unix_connection(address)
+    return await asyncio.open_connection(*address)
+
+
+async def _run_client(address, requests, latencies):
+    reader, writer = await _open_connection(address)
+    try:
+        for request in requests:
+            start = time.perf_counter()
+            writer.write(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+            await writer.drain()
+            await reader.readline()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+# the given requests are sent again and again by every client, each on its own connection and
+# waiting for every answer before the next request
+async def measure_throughput(address, requests, clients=8, requests_per_client=100):
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_run_client(address, [requests[i % len(requests)] for i in range(requests_per_client)],
+                                       latencies) for _ in range(clients)))
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'clients': clients,
+        'requests': len(latencies),
+        'seconds': seconds,
+        'requests_per_second': len(latencies) / seconds if seconds > 0 else None,
+        'p50_seconds': latencies[len(latencies) // 2],
+        'p99_seconds': latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]}
+
+
+async def _serve(arguments):
+    server = LibraryServer(arguments.library, arguments.workers)
+    address = await server.start(arguments.host, arguments.port, arguments.socket)
+    print('Servindo ' + arguments.library + ' em ' + str(address), flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def _get_address(arguments):
+    return arguments.socket if arguments.socket is not None else (arguments.host, arguments.port)
+
+
+# a mix of reads over the first articles of the library
+async def _bench(arguments):
+    with LibraryClient(_get_address(arguments)) as client:
+        titles = [row['Title'] for row in client.request('list', limit=arguments.titles)]
+    requests = [{'op': 'list', 'limit': 20}]
+    for title in titles:
+        requests.append({'op': 'get', 'title': title})
+        requests.append({'op': 'similar', 'title': title, 'k': 5})
+        requests.append({'op': 'search', 'query': title, 'k': 5})
+    results = await measure_throughput(_get_address(arguments), requests, arguments.clients, arguments.requests)
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Servidor local do Alexandria')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help='mantém a biblioteca em memória e atende os clientes')
+    serve.add_argument('library')
+    serve.add_argument('--workers', type=int, default=4, help='threads para as leituras')
+    bench = commands.add_parser('bench', help='mede a vazão de um servidor já iniciado')
+    bench.add_argument('--clients', type=int, default=8)
+    bench.add_argument('--requests', type=int, default=100, help='requisições por cliente')
+    bench.add_argument('--titles', type=int, default=20, help='artigos consultados')
+    for command in (serve, bench):
+        command.add_argument('--host', default='127.0.0.1')
+        command.add_argument('--port', type=int, default=8765)
+        command.add_argument('--socket', help='caminho de um socket Unix, no lugar de host e porta')
+    arguments = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve(arguments) if arguments.command == 'serve' else _bench(arguments))
+    except KeyboardInterrupt:
+        pass
+    except (OSError, ServerError) as e:
+        print(e.args[-1] if e.args else e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+import functools
+import os
+from lets_alexandria.core_entities import Article, Library
+from lets_alexandria.instrumentation import instrumented
+from lets_alexandria.storage import get_shard_filename, is_sharded, load_jsonl, load_jsonl_metadata, \
+    load_manifest, save_jsonl, save_manifest
+
+
+# the Library method, called once every shard has been read
+def _with_all_shards(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._load_all()
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+# Library saved as one shard per tag (see storage.is_sharded). Loading a .shards directory only reads
+# its manifest: a shard is read the first time a query needs its tag, and queries over every tag read
+# the remaining ones. Saving to the same directory rewrites only the shards that changed
+class ShardedLibrary(Library):
+    def __init__(self, name, articles=None):
+        # the directory the shards were loaded from (or last saved to) and tag -> file name there
+        self._directory = None
+        self._shard_files = {}
+        # articles per tag in the manifest, for the shards not read yet
+        self._shard_sizes = {}
+        self._pending = set()
+        # tags whose shard no longer matches the articles in memory
+        self._dirty = set()
+        self._lazy = False
+        super().__init__(name, articles)
+
+    def load(self, file_name, lazy=False, strict=False):
+        if not is_sharded(file_name):
+            super().load(file_name, lazy, strict)
+            self._directory = None
+            self._shard_files = {}
+            self._dirty = set(self._tags)
+            return
+        self.close_journal()
+        try:
+            manifest = load_manifest(file_name)
+            self._load_header(manifest)
+            self._directory = file_name
+            self._lazy = lazy
+            self._shard_files = {shard['Tag']: shard['File'] for shard in manifest['Shards']}
+            self._shard_sizes = {shard['Tag']: shard['Articles'] for shard in manifest['Shards']}
+            self._pending = set(self._shard_files)
+            self._dirty = set()
+        except (KeyError, TypeError, ValueError):
+            if strict:
+                raise
+            print('Error loading Library!')
+
+    # everything on disk is now out of date. The shards not read yet are forgotten first, or
+    # Library.clear would read them to index them again in LSH or duplicate detection
+    def clear(self):
+        self._pending = set()
+        super().clear()
+        self._dirty = set(self._shard_files)
+
+    @instrumented('load.shard')
+    def _load_shard(self, tag):
+        if tag not in self._pending:
+            return
+        self._pending.discard(tag)
+        filepath = os.path.join(self._directory, self._shard_files[tag])
+        if self._lazy:
+            _, store, items = load_jsonl_metadata(filepath)
+            articles = (Article.from_lazy_record(metadata, functools.partial(store.read_text, start, end))
+                        for metadata, start, end in items)
+        else:
+            _, records = load_jsonl(filepath)
+            articles = (Article.from_record(record) for record in records)
+        super().add_articles(articles, check_duplicates=False)
+        self._dirty.discard(tag)
+
+    def _load_all(self):
+        for tag in sorted(self._pending):
+            self._load_shard(tag)
+
+    def get_loaded_tags(self):
+        return sorted(tag for tag in self._tags if tag not in self._pending)
+
+    # every tag of the library, read or not, with its number of articles
+    def get_tag_counts(self):
+        counts = {tag: self._shard_sizes[tag] for tag in self._pending}
+        counts.update((tag, len(articles)) for tag, articles in self._tags.items())
+        return counts
+
+    # an article can only join a shard that has been read, or saving would lose the rest of it
+    def _register(self, article):
+        self._load_shard(article.get_tag())
+        super()._register(article)
+        self._dirty.add(article.get_tag())
+
+    def _discard(self, article):
+        super()._discard(article)
+        self._dirty.add(article.get_tag())
+
+    def _article_changed(self, article, field, old_value):
+        if field == 'tag':
+            self._load_shard(article.get_tag())
+            self._dirty.add(old_value)
+        self._dirty.add(article.get_tag())
+        super()._article_changed(article, field, old_value)
+
+    # queries scoped to one tag read only its shard
+    def get_articles_by_tag(self, tag):
+        self._load_shard(tag)
+        return super().get_articles_by_tag(tag)
+
+    def iter_articles_by_tag(self, tag):
+        self._load_shard(tag)
+        return super().iter_articles_by_tag(tag)
+
+    def search(self, query, k=10, tag=None, since=None, until=None):
+        if tag is None:
+            self._load_all()
+        else:
+            self._load_shard(tag)
+        return super().search(query, k, tag, since, until)
+
+    def get_most_similar(self, article, k=1, exact=False, tag=None):
+        if tag is None:
+            self._load_all()
+        else:
+            self._load_shard(tag)
+        return super().get_most_similar(article, k, exact, tag)
+
+    def remove_article(self, article):
+        self._load_shard(article.get_tag())
+        super().remove_article(article)
+
+    # the rest needs every article
+    articles = property(_with_all_shards(Library.articles.fget))
+    get_article_by_name = _with_all_shards(Library.get_article_by_name)
+    get_articles_by_date = _with_all_shards(Library.get_articles_by_date)
+    iter_articles_by_date = _with_all_shards(Library.iter_articles_by_date)
+    get_articles_between = _with_all_shards(Library.get_articles_between)
+    iter_articles_between = _with_all_shards(Library.iter_articles_between)
+    get_articles_sorted = _with_all_shards(Library.get_articles_sorted)
+    iter_articles_sorted = _with_all_shards(Library.iter_articles_sorted)
+    calculate_similarities = _with_all_shards(Library.calculate_similarities)
+    calculate_all_similarities = _with_all_shards(Library.calculate_all_similarities)
+    get_greatest_similarity = _with_all_shards(Library.get_greatest_similarity)
+
+    # anything but a .shards directory is saved as a single file, like Library does
+    def save(self, filepath):
+        if not is_sharded(filepath):
+            self._load_all()
+            super().save(filepath)
+            return
+        self._save_shards(filepath)
+
+    # the shards are written before the manifest and the emptied ones are only deleted after it,
+    # so a failed save leaves the previous manifest with all its files
+    @instrumented('save.shards')
+    def _save_shards(self, directory):
+        if directory != self._directory:
+            self._load_all()
+            os.makedirs(directory, exist_ok=True)
+            self._directory = directory
+            self._shard_files = {}
+            self._dirty = set(self._tags)
+        removed = []
+        for tag in sorted(self._dirty):
+            articles = self._tags.get(tag)
+            if articles:
+                if tag not in self._shard_files:
+                    self._shard_files[tag] = get_shard_filename(tag, self._shard_files.values())
+                save_jsonl(os.path.join(directory, self._shard_files[tag]), self.name,
+                           (article.to_record() for article in articles.values()))
+            elif tag in self._shard_files:
+                removed.append(self._shard_files.pop(tag))
+        counts = self.get_tag_counts()
+        save_manifest(directory, self.name, [{'Tag': tag, 'File': filename, 'Articles': counts[tag]}
+                                             for tag, filename in sorted(self._shard_files.items())])
+        for filename in removed:
+            os.remove(os.path.join(directory, filename))
+        self._dirty = set()
@@ -0,0 +1,450 @@
+import bisect
+import heapq
+import itertools
+import math
+import os
+import zlib
+from array import array
+from collections import Counter
+
+
+# number of unique words in common divided by the number of unique words of both articles
+def jaccard_similarity(common, size_a, size_b):
+    return float("{:.4f}". format(common/(size_a + size_b - common)))
+
+
+# library-wide word <-> integer id mapping
+class Vocabulary:
+    def __init__(self, words=()):
+        self.words = list(words)
+        self.ids = {word: word_id for word_id, word in enumerate(self.words)}
+
+    def __len__(self):
+        return len(self.words)
+
+    def get_id(self, word):
+        word_id = self.ids.get(word)
+        if word_id is None:
+            word_id = len(self.words)
+            self.ids[word] = word_id
+            self.words.append(word)
+        return word_id
+
+    # 4 bytes per unique word instead of a set of strings
+    def encode(self, words):
+        return array('I', sorted(self.get_id(word) for word in words))
+
+
+# word -> articles posting lists, so only articles that really share a word are ever compared
+class WordIndex:
+    def __init__(self, articles=()):
+        self.postings = {}
+        self.indexed_words = {}
+        for article in articles:
+            self.add(article)
+
+    def add(self, article):
+        key = id(article)
+        if key in self.indexed_words:
+            return
+        words = article.get_words()
+        self.indexed_words[key] = words
+        for word in words:
+            posting = self.postings.get(word)
+            if posting is None:
+                self.postings[word] = {key}
+            else:
+                posting.add(key)
+
+    def remove(self, article):
+        words = self.indexed_words.pop(id(article), None)
+        if words is None:
+            return
+        for word in words:
+            posting = self.postings[word]
+            posting.discard(id(article))
+            if not posting:
+                del self.postings[word]
+
+    def update(self, article):
+        self.remove(article)
+        self.add(article)
+
+    # counts, for every pair (i, j) with i < j, how many unique words the articles share
+    def count_shared_words(self, articles):
+        position = {id(article): i for i, article in enumerate(articles)}
+        shared = [Counter() for _ in articles]
+        for posting in self.postings.values():
+            if len(posting) < 2:
+                continue
+            members = sorted(position[key] for key in posting)
+            for n, i in enumerate(members[:-1]):
+                shared[i].update(members[n + 1:])
+        return shared
+
+    # id(other) -> shared unique words, for every other indexed article sharing at least one word
+    def count_shared_with(self, article):
+        shared = Counter()
+        for word in article.get_words():
+            posting = self.postings.get(word)
+            if posting is not None:
+                shared.update(posting)
+        shared.pop(id(article), None)
+        return shared
+
+    def get_word_count(self, key):
+        return len(self.indexed_words[key])
+
+
+# sparse, symmetric similarity rows, id(article) -> {id(other): similarity}, holding only the pairs
+# that share a word. Adding, removing or changing an article only touches its own row and column
+class SimilarityCache:
+    # without articles no row is computed up front, each one is scored the first time get_row asks
+    # for it (complete stays False). rows, when given, are complete rows computed before for some of
+    # the articles (see Library.load_cache), only the other articles are scored
+    def __init__(self, word_index, articles=None, rows=None):
+        self.word_index = word_index
+        self.complete = articles is not None
+        if articles is None:
+            self.rows = {}
+            return
+        if rows is not None:
+            self.rows = rows
+            missing = [article for article in articles if id(article) not in rows]
+            for article in missing:
+                self.rows[id(article)] = {}
+            for article in missing:
+                self.add(article)
+            return
+        self.rows = {id(article): {} for article in articles}
+        keys = list(self.rows)
+        sizes = [article.get_word_count() for article in articles]
+        for i, shared in enumerate(word_index.count_shared_words(articles)):
+            row = self.rows[keys[i]]
+            for j, common in shared.items():
+                similarity = jaccard_similarity(common, sizes[i], sizes[j])
+                row[keys[j]] = similarity
+                self.rows[keys[j]][keys[i]] = similarity
+
+    # the article has to be in the word index already
+    def _score(self, article):
+        size = article.get_word_count()
+        return {other: jaccard_similarity(common, size, self.word_index.get_word_count(other))
+                for other, common in self.word_index.count_shared_with(article).items()}
+
+    def add(self, article):
+        key = id(article)
+        row = self._score(article)
+        self.rows[key] = row
+        for other, similarity in row.items():
+            other_row = self.rows.get(other)
+            if other_row is not None:
+                other_row[key] = similarity
+
+    def remove(self, article):
+        key = id(article)
+        row = self.rows.pop(key, None)
+        if row is None:
+            # never scored, but the rows scored on demand may still hold it
+            for other_row in self.rows.values():
+                other_row.pop(key, None)
+            return
+        for other in row:
+            other_row = self.rows.get(other)
+            if other_row is not None:
+                del other_row[key]
+
+    def update(self, article):
+        self.remove(article)
+        self.add(article)
+
+    def get_row(self, article):
+        row = self.rows.get(id(article))
+        if row is None:
+            row = self.rows[id(article)] = self._score(article)
+        return row
+
+    def to_matrix(self, articles):
+        position = {id(article): i for i, article in enumerate(articles)}
+        answer = [[0.0] * len(articles) for _ in articles]
+        for i, article in enumerate(articles):
+            answer[i][i] = 1.0
+            for other, similarity in self.rows[id(article)].items():
+                answer[i][position[other]] = similarity
+        return answer
+
+
+MERSENNE_PRIME = (1 << 61) - 1
+
+
+# the universal hash functions (a * x + b) mod p play the role of random permutations of the vocabulary
+class MinHasher:
+    def __init__(self, num_perm=64, seed=1):
+        import random
+        generator = random.Random(seed)
+        self.num_perm = num_perm
+        self.seed = seed
+        self.permutations = [(generator.randrange(1, MERSENNE_PRIME), generator.randrange(MERSENNE_PRIME))
+                             for _ in range(num_perm)]
+
+    def get_key(self):
+        return self.num_perm, self.seed
+
+    def signature(self, words):
+        hashes = [zlib.crc32(word.encode('utf-8')) for word in words]
+        return tuple(min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in self.permutations)
+
+
+# banded locality-sensitive hashing: articles sharing all the rows of any band become candidates.
+# more rows per band means fewer false candidates, more bands means fewer missed neighbours
+class LSHIndex:
+    def __init__(self, bands=16, rows=4, seed=1):
+        self.bands = bands
+        self.rows = rows
+        self.minhasher = MinHasher(bands * rows, seed)
+        self.tables = [{} for _ in range(bands)]
+        self.band_keys = {}
+
+    def _get_band_keys(self, article):
+        signature = article.get_minhash(self.minhasher)
+        return [signature[band * self.rows:(band + 1) * self.rows] for band in range(self.bands)]
+
+    def add(self, article):
+        key = id(article)
+        if key in self.band_keys:
+            return
+        band_keys = self._get_band_keys(article)
+        self.band_keys[key] = band_keys
+        for table, band_key in zip(self.tables, band_keys):
+            bucket = table.get(band_key)
+            if bucket is None:
+                table[band_key] = {key: article}
+            else:
+                bucket[key] = article
+
+    def remove(self, article):
+        band_keys = self.band_keys.pop(id(article), None)
+        if band_keys is None:
+            return
+        for table, band_key in zip(self.tables, band_keys):
+            bucket = table[band_key]
+            del bucket[id(article)]
+            if not bucket:
+                del table[band_key]
+
+    def update(self, article):
+        self.remove(article)
+        self.add(article)
+
+    def get_candidates(self, article):
+        band_keys = self.band_keys.get(id(article)) or self._get_band_keys(article)
+        candidates = {}
+        for table, band_key in zip(self.tables, band_keys):
+            candidates.update(table.get(band_key, {}))
+        candidates.pop(id(article), None)
+        return list(candidates.values())
+
+
+# the similarities are rounded to 4 places, so a pair whose exact similarity is this much below the
+# threshold can still reach it
+_ROUNDING_MARGIN = 0.00005
+
+
+# all-pairs join with prefix and length filtering: with every word set sorted from the rarest word to
+# the most common, two sets x and y (|y| <= |x|) of similarity t or more share at least
+# t (|x| + |y|) / (1 + t) words, y has at least t |x| words, and at most |x| - p of the shared words
+# are outside the first p = |x| - ceil(t |x|) + 1 words of x. The sets are visited from the smallest,
+# only the (usually rare) words of each prefix are looked up among the sets already visited, and a pair
+# is only compared when the shared prefix words leave it a chance to reach t. Gives (i, j, similarity)
+# with i < j, most similar first, for every pair at or above the threshold, or the k most similar pairs
+# (then the threshold grows with the k-th best similarity found so far). Pairs without any word in
+# common are never given
+def similar_pairs(word_sets, threshold=None, k=None):
+    if (threshold is None) == (k is None):
+        raise ValueError("Either a threshold or k is needed")
+    if k is not None and k <= 0:
+        return []
+    frequency = Counter(word for words in word_sets for word in words)
+    # word -> (sizes, indexes) of the visited sets with the word, in visiting order, so by size
+    postings = {}
+    found = []
+    for x in sorted(range(len(word_sets)), key=lambda i: len(word_sets[i])):
+        words = word_sets[x]
+        size = len(words)
+        if k is None:
+            bound = threshold
+        else:
+            bound = found[0][0] if len(found) == k else 0.0
+        bound = max(0.0, bound - _ROUNDING_MARGIN)
+        prefix_size = min(size, size - math.ceil(bound * size - 1e-9) + 1)
+        minimum_size = bound * size - 1e-9
+        shared = Counter()
+        for word in sorted(words, key=lambda word: (frequency[word], word))[:prefix_size]:
+            posting = postings.get(word)
+            if posting is None:
+                continue
+            # the minimum size only grows, the sets too small for this one are too small for the rest
+            sizes, indexes = posting
+            start = bisect.bisect_left(sizes, minimum_size)
+            if start:
+                del sizes[:start]
+                del indexes[:start]
+            shared.update(indexes)
+        rest = size - prefix_size
+        for y, count in shared.items():
+            other_size = len(word_sets[y])
+            if count + rest < bound * (size + other_size) / (1 + bound) - 1e-9:
+                continue
+            similarity = jaccard_similarity(len(words & word_sets[y]), size, other_size)
+            pair = (similarity, min(x, y), max(x, y))
+            if k is None:
+                if similarity >= threshold:
+                    found.append(pair)
+            elif len(found) < k:
+                heapq.heappush(found, pair)
+            elif similarity > found[0][0]:
+                heapq.heapreplace(found, pair)
+        for word in words:
+            posting = postings.get(word)
+            if posting is None:
+                postings[word] = ([size], [x])
+            else:
+                posting[0].append(size)
+                posting[1].append(x)
+    return [(i, j, similarity) for similarity, i, j in sorted(found, key=lambda pair: (-pair[0], pair[1], pair[2]))]
+
+
+# numpy and scipy are optional, they are only imported when the sparse backend is used.
+# token_ids holds every article's sorted word ids (see Vocabulary), n_terms the vocabulary size
+def sparse_similarities(token_ids, n_terms, output='list', k=10):
+    try:
+        import numpy
+        from scipy import sparse
+    except ImportError as error:
+        raise ImportError("The sparse backend needs numpy and scipy installed") from error
+
+    # binary article x term matrix, built straight in CSR form
+    indptr = numpy.cumsum([0] + [len(ids) for ids in token_ids])
+    indices = numpy.fromiter(itertools.chain.from_iterable(token_ids), dtype=numpy.int64, count=indptr[-1])
+    n = len(token_ids)
+    terms = sparse.csr_matrix((numpy.ones(len(indices), dtype=numpy.int32), indices, indptr), shape=(n, n_terms))
+
+    # one sparse product gives every intersection count, the row sums give the set sizes
+    sizes = numpy.diff(indptr)
+    common = (terms @ terms.T).tocsr()
+    common.sort_indices()
+    rows = numpy.repeat(numpy.arange(n), numpy.diff(common.indptr))
+    values = common.data / (sizes[rows] + sizes[common.indices] - common.data)
+
+    if output == 'dense':
+        answer = numpy.zeros((n, n))
+        answer[rows, common.indices] = _round_4(numpy, values)
+        return answer
+    if output == 'topk':
+        return _sparse_top_k(sparse, numpy, common.indptr, common.indices, values, n, k)
+    if output == 'list':
+        # round() rounds exactly like the "{:.4f}" formatting used by jaccard_similarity
+        answer = [[0.0] * n for _ in range(n)]
+        for i, j, value in zip(rows.tolist(), common.indices.tolist(), values.tolist()):
+            answer[i][j] = round(value, 4)
+        return answer
+    raise ValueError("Unknown output: " + str(output))
+
+
+# numpy.round scales by 10**4 before rounding, which can disagree with round() next to a tie,
+# so the few values close to a tie are rounded again by python
+def _round_4(numpy, values):
+    answer = numpy.round(values, 4)
+    scaled = values * 10000
+    near_tie = numpy.flatnonzero(numpy.abs(scaled - numpy.floor(scaled) - 0.5) < 1e-6)
+    for i in near_tie.tolist():
+        answer[i] = round(float(values[i]), 4)
+    return answer
+
+
+# keeps, for every article, only its k most similar other articles
+def _sparse_top_k(sparse, numpy, indptr, indices, values, n, k):
+    top_rows = []
+    top_columns = []
+    top_values = []
+    for i in range(n):
+        columns = indices[indptr[i]:indptr[i + 1]]
+        scores = values[indptr[i]:indptr[i + 1]]
+        others = columns != i
+        columns = columns[others]
+        scores = scores[others]
+        if len(scores) > k:
+            best = numpy.argpartition(-scores, k)[:k]
+            columns = columns[best]
+            scores = scores[best]
+        top_rows.append(numpy.full(len(columns), i))
+        top_columns.append(columns)
+        top_values.append(_round_4(numpy, scores))
+    if not top_rows:
+        return sparse.csr_matrix((n, n))
+    return sparse.csr_matrix((numpy.concatenate(top_values), (numpy.concatenate(top_rows), numpy.concatenate(top_columns))),
+                             shape=(n, n))
+
+
+_worker_token_sets = None
+
+
+# the process pool only receives the compact word id arrays, never whole articles. In CPython a
+# set intersection is faster than merging two sorted arrays, so each worker builds the sets once
+def _init_worker(token_ids):
+    global _worker_token_sets
+    _worker_token_sets = [frozenset(ids) for ids in token_ids]
+
+
+# similarities of the rows [start, stop) with every article after them
+def _similarity_block(start, stop):
+    token_sets = _worker_token_sets
+    block = []
+    for i in range(start, stop):
+        tokens = token_sets[i]
+        block.append([jaccard_similarity(len(tokens & other), len(tokens), len(other))
+                      for other in token_sets[i + 1:]])
+    return block
+
+
+def _similarity_column(start, stop, query, query_size):
+    return [jaccard_similarity(len(tokens & query), len(tokens), query_size)
+            for tokens in _worker_token_sets[start:stop]]
+
+
+def _get_blocks(n, workers, chunk_size):
+    if chunk_size is None:
+        chunk_size = max(1, -(-n // (workers * 4)))
+    return [(start, min(start + chunk_size, n)) for start in range(0, n, chunk_size)]
+
+
+def _get_pool(token_ids, workers):
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(token_ids,))
+
+
+def parallel_similarities(token_ids, workers=None, chunk_size=None):
+    workers = workers or os.cpu_count()
+    n = len(token_ids)
+    answer = [[0.0] * n for _ in range(n)]
+    with _get_pool(token_ids, workers) as pool:
+        blocks = _get_blocks(n, workers, chunk_size)
+        futures = [pool.submit(_similarity_block, start, stop) for start, stop in blocks]
+        for (start, stop), future in zip(blocks, futures):
+            for i, row in zip(range(start, stop), future.result()):
+                answer[i][i] = 1.0
+                for j, similarity in enumerate(row, i + 1):
+                    answer[i][j] = similarity
+                    answer[j][i] = similarity
+    return answer
+
+
+def parallel_similarities_with(token_ids, query_ids, workers=None, chunk_size=None):
+    workers = workers or os.cpu_count()
+    answer = []
+    with _get_pool(token_ids, workers) as pool:
+        futures = [pool.submit(_similarity_column, start, stop, frozenset(query_ids), len(query_ids))
+                   for start, stop in _get_blocks(len(token_ids), workers, chunk_size)]
+        for future in futures:
+            answer.extend(future.result())
+    return answer
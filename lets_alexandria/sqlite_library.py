@@ -0,0 +1,177 @@
+import datetime
+import heapq
+import os
+import sqlite3
+from lets_alexandria.core_entities import Article
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS library (name TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    date TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS articles_title ON articles (title);
+CREATE INDEX IF NOT EXISTS articles_tag ON articles (tag);
+CREATE INDEX IF NOT EXISTS articles_date ON articles (date);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_text USING fts5 (text, content='articles', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS articles_insert AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_text (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_delete AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_text (articles_text, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_update AFTER UPDATE ON articles BEGIN
+    INSERT INTO articles_text (articles_text, rowid, text) VALUES ('delete', old.id, old.text);
+    INSERT INTO articles_text (rowid, text) VALUES (new.id, new.text);
+END;
+"""
+
+COLUMNS = "title, tag, date, text"
+
+
+# same API as Library, but the articles live in an SQLite database (dates stored as ISO text so they
+# sort correctly) and every change is its own transaction. The articles handed out are copies:
+# changing them does not change the database
+class SQLiteLibrary:
+    def __init__(self, name, articles=None, *, filepath=':memory:'):
+        self.filepath = filepath
+        self.connection = self._connect(filepath)
+        if self.get_name() is None:
+            self.set_name(name)
+        if articles:
+            self.add_articles(articles)
+
+    def _connect(self, filepath):
+        connection = sqlite3.connect(filepath)
+        connection.executescript(SCHEMA)
+        return connection
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def _to_row(article):
+        return article.get_title(), article.get_tag(), article.get_date().isoformat(), article.get_text()
+
+    @staticmethod
+    def _to_article(row):
+        title, tag, date, text = row
+        article = Article(title, tag, text=text)
+        article.set_date(datetime.date.fromisoformat(date))
+        return article
+
+    def _select(self, where='', parameters=(), order='id'):
+        cursor = self.connection.execute(
+            "SELECT " + COLUMNS + " FROM articles " + where + " ORDER BY " + order, parameters)
+        for row in cursor:
+            yield self._to_article(row)
+
+    def add_article(self, article):
+        with self.connection:
+            self.connection.execute("INSERT INTO articles (" + COLUMNS + ") VALUES (?, ?, ?, ?)",
+                                    self._to_row(article))
+
+    def add_articles(self, articles):
+        with self.connection:
+            self.connection.executemany("INSERT INTO articles (" + COLUMNS + ") VALUES (?, ?, ?, ?)",
+                                        (self._to_row(article) for article in articles))
+
+    def remove_article_by_name(self, name):
+        with self.connection:
+            cursor = self.connection.execute(
+                "DELETE FROM articles WHERE id = (SELECT id FROM articles WHERE title = ? ORDER BY id LIMIT 1)",
+                (name,))
+        return cursor.rowcount > 0
+
+    def remove_article(self, article):
+        with self.connection:
+            cursor = self.connection.execute(
+                "DELETE FROM articles WHERE id = (SELECT id FROM articles "
+                "WHERE title = ? AND tag = ? AND date = ? AND text = ? ORDER BY id LIMIT 1)",
+                self._to_row(article))
+        if cursor.rowcount == 0:
+            raise ValueError("Article not in library")
+
+    def get_name(self):
+        row = self.connection.execute("SELECT name FROM library").fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def set_name(self, name):
+        with self.connection:
+            self.connection.execute("DELETE FROM library")
+            self.connection.execute("INSERT INTO library (name) VALUES (?)", (name,))
+
+    def get_articles(self):
+        return list(self._select())
+
+    def get_article_by_name(self, name):
+        return next(self._select("WHERE title = ?", (name,)), None)
+
+    def get_articles_by_tag(self, tag):
+        return list(self._select("WHERE tag = ?", (tag,)))
+
+    def get_articles_by_date(self, date):
+        return list(self._select("WHERE date >= ?", (date.isoformat(),), "date, id"))
+
+    def get_articles_between(self, start, end):
+        return list(self._select("WHERE date BETWEEN ? AND ?", (start.isoformat(), end.isoformat()), "date, id"))
+
+    def get_articles_sorted(self):
+        return list(self.iter_articles_sorted())
+
+    def iter_articles_sorted(self):
+        return self._select(order="date DESC, id DESC")
+
+    # every word has to appear in the text, the best bm25 matches come first
+    def search_words(self, query, limit=10):
+        words = ['"' + word.replace('"', '""') + '"' for word in query.split()]
+        if not words:
+            return []
+        cursor = self.connection.execute(
+            "SELECT articles.title, articles.tag, articles.date, articles.text "
+            "FROM articles JOIN articles_text ON articles.id = articles_text.rowid "
+            "WHERE articles_text MATCH ? ORDER BY bm25(articles_text) LIMIT ?", (' '.join(words), limit))
+        return [self._to_article(row) for row in cursor]
+
+    # the articles are streamed from the database instead of being loaded all at once
+    def calculate_similarities(self, article):
+        return [other.calculate_similarity(article) for other in self._select()]
+
+    # only the k best stay in memory; the stored copy of the article itself (the first equal one)
+    # is not a candidate
+    def get_most_similar(self, article, k=1):
+        return heapq.nlargest(k, self._score_others(article), key=lambda candidate: candidate[1])
+
+    def _score_others(self, article):
+        skipped = False
+        for other in self._select():
+            if not skipped and other == article:
+                skipped = True
+                continue
+            yield other, other.calculate_similarity(article)
+
+    # every change is already committed, saving elsewhere copies the whole database
+    def save(self, filepath):
+        if filepath == self.filepath:
+            self.connection.commit()
+            return
+        destination = sqlite3.connect(filepath)
+        with destination:
+            self.connection.backup(destination)
+        destination.close()
+
+    # like Library.load, a missing file raises FileNotFoundError instead of creating an empty database
+    def load(self, filepath):
+        if filepath != ':memory:' and not os.path.isfile(filepath):
+            raise FileNotFoundError("Library not found: " + filepath)
+        name = self.get_name()
+        self.connection.close()
+        self.filepath = filepath
+        self.connection = self._connect(filepath)
+        if self.get_name() is None:
+            self.set_name(name)
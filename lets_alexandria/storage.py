@@ -0,0 +1,344 @@
+import csv
+import datetime
+import glob
+import json
+import mmap
+import os
+import re
+import sys
+
+# JSON Lines library format: the first line is a header, {"Library": name, "Generation": n}, and every
+# following line one article, {"Title", "Tag", "Date", "Text"}, so libraries are written and read one
+# article at a time. The generation tells which journal belongs to the snapshot
+
+
+def is_jsonl(filepath):
+    return filepath.endswith('.jsonl')
+
+
+def _dump_line(record):
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+# writes to a temporary file first, so a failed save never destroys the previous library
+def save_jsonl(filepath, name, records, generation=0):
+    temporary_path = filepath + '.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as file:
+        file.write(_dump_line({'Library': name, 'Generation': generation}))
+        for record in records:
+            file.write(_dump_line(record))
+    os.replace(temporary_path, filepath)
+
+
+def _check_header(header):
+    if 'Library' not in header:
+        raise KeyError('Library')
+    return header
+
+
+# gives the header and a generator over the article records
+def load_jsonl(filepath):
+    file = open(filepath, 'r', encoding='utf-8')
+    try:
+        header = _check_header(json.loads(file.readline()))
+    except (KeyError, ValueError):
+        file.close()
+        raise
+    return header, _iter_records(file)
+
+
+def _iter_records(file):
+    with file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+# "Text" is the last key of every article line this module writes and a quote inside a JSON string is
+# always escaped, so the first ', "Text": ' of a line separates the metadata from the text
+TEXT_MARKER = b', "Text": '
+METADATA_KEYS = ('Title', 'Tag', 'Date')
+_DECODER = json.JSONDecoder()
+
+
+# memory-mapped library file, the texts are decoded only when an article asks for them
+class TextStore:
+    def __init__(self, filepath):
+        with open(filepath, 'rb') as file:
+            self.mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # the span starts with either the JSON string of the text or, for lines written some other way,
+    # the whole article record. Only that first value is read, other keys may follow the text
+    def read_text(self, start, end):
+        value, _ = _DECODER.raw_decode(self.mapping[start:end].decode('utf-8'))
+        if isinstance(value, dict):
+            return value['Text']
+        return value
+
+
+# gives the header, the text store and a generator of (metadata, text start, text end)
+def load_jsonl_metadata(filepath):
+    store = TextStore(filepath)
+    end_of_header = store.mapping.find(b'\n')
+    header = _check_header(json.loads(store.mapping[:end_of_header]))
+    return header, store, _iter_metadata(store.mapping, end_of_header + 1)
+
+
+# lines that don't follow the layout of save_jsonl (other separators, metadata after "Text") are parsed
+# whole, and a line that is not valid JSON raises ValueError like load_jsonl does
+def _iter_metadata(mapping, position):
+    size = len(mapping)
+    while position < size:
+        end = mapping.find(b'\n', position)
+        if end == -1:
+            end = size
+        line = mapping[position:end].strip()
+        if line:
+            metadata = _read_metadata(mapping, position, end)
+            if metadata is not None:
+                yield metadata
+            else:
+                record = json.loads(line)
+                if 'Text' not in record:
+                    raise KeyError('Text')
+                yield {key: record[key] for key in METADATA_KEYS}, position, end
+        position = end + 1
+
+
+# the metadata and text span of a line written by save_jsonl, or None
+def _read_metadata(mapping, position, end):
+    marker = mapping.find(TEXT_MARKER, position, end)
+    if marker == -1 or not mapping[position:end].rstrip().endswith(b'}'):
+        return None
+    try:
+        metadata = json.loads(mapping[position:marker] + b'}')
+    except ValueError:
+        return None
+    if not isinstance(metadata, dict) or any(key not in metadata for key in METADATA_KEYS):
+        return None
+    # the text goes from after the marker up to the closing brace of the line
+    return metadata, marker + len(TEXT_MARKER), mapping.rfind(b'}', marker, end)
+
+
+# the old format is a single repr() of the whole library, read with literal_eval
+def load_legacy(filepath):
+    from ast import literal_eval
+    with open(filepath, 'r') as file:
+        proto_library = literal_eval(file.read())
+    return {'Library': proto_library['Library']}, iter(proto_library['Articles'])
+
+
+# every file of a directory (and its subdirectories) matching the pattern, or every match of a glob
+def find_article_files(path, pattern='*.txt'):
+    if not os.path.isdir(path):
+        return sorted(glob.glob(path, recursive=True))
+    return sorted(glob.glob(os.path.join(path, '**', pattern), recursive=True))
+
+
+# CSV manifest with the columns File, Title, Tag and Date (dd/mm/yyyy), File relative to the manifest
+def read_manifest(filepath):
+    directory = os.path.dirname(os.path.abspath(filepath))
+    with open(filepath, 'r', encoding='utf-8', newline='') as file:
+        return {os.path.normpath(os.path.join(directory, row['File'])): row for row in csv.DictReader(file)}
+
+
+# files named <tag>__<dd-mm-yyyy>__<title>.txt, anything else becomes an untagged article titled
+# after the file name
+def parse_article_filename(filepath):
+    name = os.path.splitext(os.path.basename(filepath))[0]
+    parts = name.split('__')
+    if len(parts) == 3:
+        tag, date, title = parts
+        try:
+            date = datetime.datetime.strptime(date, '%d-%m-%Y').strftime('%d/%m/%Y')
+        except ValueError:
+            date = None
+        return {'Title': title, 'Tag': tag, 'Date': date}
+    return {'Title': name, 'Tag': '', 'Date': None}
+
+
+def _read_file(filepath):
+    with open(filepath, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+# the files are read concurrently by a pool of threads (the work is I/O), the metadata comes from the
+# manifest when the file is listed there and from the file name otherwise
+def read_article_files(filepaths, manifest=None, workers=8):
+    from concurrent.futures import ThreadPoolExecutor
+    entries = read_manifest(manifest) if manifest is not None else {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        texts = pool.map(_read_file, filepaths)
+        answer = []
+        for filepath, text in zip(filepaths, texts):
+            metadata = entries.get(os.path.normpath(os.path.abspath(filepath)))
+            if metadata is None:
+                metadata = parse_article_filename(filepath)
+            answer.append((metadata, text))
+    return answer
+
+
+# sharded libraries are directories named <library>.shards with one .jsonl file per tag and a
+# manifest.json, {"Library": name, "Shards": [{"Tag", "File", "Articles"}]}, saying which file holds
+# which tag
+MANIFEST_NAME = 'manifest.json'
+
+
+def is_sharded(filepath):
+    return filepath.rstrip('/\\').endswith('.shards')
+
+
+def save_manifest(directory, name, shards):
+    filepath = os.path.join(directory, MANIFEST_NAME)
+    temporary_path = filepath + '.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as file:
+        json.dump({'Library': name, 'Shards': shards}, file, ensure_ascii=False, indent=1)
+    os.replace(temporary_path, filepath)
+
+
+def load_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_NAME), 'r', encoding='utf-8') as file:
+        manifest = _check_header(json.load(file))
+    if 'Shards' not in manifest:
+        raise KeyError('Shards')
+    return manifest
+
+
+# a file name made from the tag, different (ignoring case) from the ones already taken
+def get_shard_filename(tag, taken):
+    base = re.sub(r'\W+', '_', tag).strip('_') or 'sem_tema'
+    taken = {filename.lower() for filename in taken}
+    filename = base + '.jsonl'
+    number = 1
+    while filename.lower() in taken:
+        number += 1
+        filename = base + '_' + str(number) + '.jsonl'
+    return filename
+
+
+# CSV report of Library.get_similar_pairs, in the given order
+def save_pairs_report(filepath, pairs):
+    with open(filepath, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Similarity', 'Title A', 'Tag A', 'Title B', 'Tag B'])
+        for article_a, article_b, similarity in pairs:
+            writer.writerow(["{:.4f}".format(similarity), article_a.get_title(), article_a.get_tag(),
+                             article_b.get_title(), article_b.get_tag()])
+
+
+# derived data of a library's articles, see Library.save_cache. A file written by another version is
+# ignored, like a missing or broken one
+CACHE_VERSION = 1
+
+
+def get_cache_path(filepath):
+    return filepath.rstrip('/\\') + '.cache'
+
+
+def save_cache(filepath, vocabulary, entries):
+    temporary_path = filepath + '.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as file:
+        json.dump({'Version': CACHE_VERSION, 'Vocabulary': vocabulary, 'Articles': entries}, file,
+                  ensure_ascii=False, separators=(',', ':'))
+    os.replace(temporary_path, filepath)
+
+
+def load_cache(filepath):
+    try:
+        with open(filepath, 'r', encoding='utf-8') as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cache, dict) or cache.get('Version') != CACHE_VERSION:
+        return None
+    return cache
+
+
+def convert_to_jsonl(source, destination):
+    header, records = load_legacy(source)
+    save_jsonl(destination, header['Library'], records)
+
+
+def get_journal_path(filepath):
+    return filepath + '.journal'
+
+
+# append-only log of the changes made after the last snapshot. The records are written right away
+# but only fsynced every batch_size records (and on sync), the first line holds the snapshot generation
+class Journal:
+    def __init__(self, filepath, generation, batch_size=32, compact_after=1000):
+        self.filepath = filepath
+        self.batch_size = batch_size
+        self.compact_after = compact_after
+        self.pending = 0
+        self.file = open(filepath, 'a', encoding='utf-8')
+        if self.file.tell() == 0 or read_journal_generation(filepath) != generation:
+            self.reset(generation)
+        else:
+            self.records = sum(1 for _ in iter_journal(filepath))
+            # the records already in the file were saved by an earlier session
+            self.commit()
+
+    def append(self, record):
+        self.file.write(_dump_line(record))
+        self.pending += 1
+        self.records += 1
+        if self.pending >= self.batch_size:
+            self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+
+    # the records written so far are saved: discard() keeps them from now on
+    def commit(self):
+        self.sync()
+        self.committed = self.file.tell()
+        self.committed_records = self.records
+
+    # drops the records written since the last commit
+    def discard(self):
+        self.file.flush()
+        self.file.truncate(self.committed)
+        self.file.seek(self.committed)
+        self.records = self.committed_records
+        self.sync()
+
+    # drops every record, used once they are part of a new snapshot
+    def reset(self, generation):
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.write(_dump_line({'Generation': generation}))
+        self.records = 0
+        self.commit()
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+
+def read_journal_generation(filepath):
+    with open(filepath, 'r', encoding='utf-8') as file:
+        try:
+            return json.loads(file.readline())['Generation']
+        except (KeyError, ValueError):
+            return None
+
+
+# a crash can leave the last record half written, it is ignored
+def iter_journal(filepath):
+    with open(filepath, 'r', encoding='utf-8') as file:
+        file.readline()
+        for line in file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('Uso: python -m lets_alexandria.storage <biblioteca.txt> <biblioteca.jsonl>')
+        sys.exit(1)
+    convert_to_jsonl(sys.argv[1], sys.argv[2])
@@ -1,17 +1,28 @@
 import datetime
+import os
 from lets_alexandria.core_entities import Library, Article
+from lets_alexandria.instrumentation import INSTRUMENTATION, profile_operation
+from lets_alexandria.storage import get_cache_path, save_pairs_report
+
+# articles shown at a time by print_articles
+PAGE_SIZE = 20
 
 class UserInterface:
     def __init__(self, library : Library = None) -> None:
         if library is None:
             library = Library("default")
         self.library = library
+        # when set, the next menu option runs under cProfile
+        self.profile_next_option = False
+        # derived data file of the loaded library, only read once a similarity option needs it
+        self.cache_path = None
+        self.cache_loaded = False
 
     def run(self) -> None:
         self.greetings()
         while True:
             self.menu()
-            option = self.get_option(8)
+            option = self.get_option(12)
             self.process_option(option)
 
 
@@ -26,6 +37,10 @@ class UserInterface:
         6 - Remover artigo (por nome)
         7 - Salvar e sair
         8 - Sair sem salvar
+        9 - Estatísticas de desempenho
+        10 - Importar artigos em lote (pasta ou padrão glob)
+        11 - Relatório dos pares de artigos mais similares
+        12 - Relatório de artigos duplicados
         """)
 
     def search_menu(self) -> None:
@@ -33,9 +48,19 @@ class UserInterface:
         0 - Nome
         1 - Data
         2 - Tema
-        3 - Voltar
+        3 - Palavras no texto
+        4 - Voltar
         """)
     
+    def stats_menu(self) -> None:
+        print("""
+        0 - Ativar/desativar coleta de estatísticas
+        1 - Mostrar estatísticas
+        2 - Salvar estatísticas em arquivo
+        3 - Perfilar a próxima opção (cProfile)
+        4 - Voltar
+        """)
+
     def add_menu(self) -> None:
         print("""
         0 - Adicionar artigo via terminal
@@ -68,15 +93,34 @@ class UserInterface:
 
     def load_library(self, filepath) -> None:
         try:
-            self.library.load(file_name=filepath)
+            self.library.load(file_name=filepath, lazy=True)
+            # changes are journaled next to .jsonl libraries, so a crash doesn't lose the session
+            if filepath.endswith('.jsonl'):
+                self.library.open_journal(filepath)
+            self.cache_path = get_cache_path(filepath)
+            self.cache_loaded = False
         except FileNotFoundError:
             self.error_message("Não foi possível carregar a biblioteca! Algum erro ocorreu! :/")
         except Exception as e:
             print(e)
     
+    # the cache is only written when this session read it, and save_cache skips it when nothing changed
     def save_library(self, filepath) -> None:
         try:
             self.library.save(filepath)
+            if self.cache_loaded:
+                self.library.save_cache(get_cache_path(filepath))
+        except Exception as e:
+            print(e)
+
+    # words, signatures and similarities computed in earlier sessions. Matching them digests every text,
+    # so a lazily loaded library is only read whole once an option compares articles
+    def load_cache(self) -> None:
+        if self.cache_path is None or self.cache_loaded:
+            return
+        self.cache_loaded = True
+        try:
+            self.library.load_cache(self.cache_path)
         except Exception as e:
             print(e)
     
@@ -99,6 +143,16 @@ class UserInterface:
         except Exception as e:
             print(e)
     
+    # the manifest is optional, without it title, tag and date come from the file names
+    def import_articles(self) -> None:
+        path = self.get_parameter("caminho da pasta ou padrão glob (ex.: data/artigos/*.txt)")
+        manifest = self.get_parameter("caminho do manifesto CSV (deixe vazio se não houver)")
+        try:
+            articles = self.library.import_articles(path, manifest or None)
+            print(str(len(articles)) + " artigos importados!")
+        except Exception as e:
+            print(e)
+
     def get_text_from_file(self, filepath) -> str:
         try:
             with open(filepath, 'r') as f:
@@ -111,14 +165,22 @@ class UserInterface:
 
     def list_articles(self) -> list:
         try:
-            return self.library.get_articles_sorted()
+            return self.library.iter_articles_sorted()
         except Exception as e:
             print(e)
     
-    def print_articles(self, articles : list) -> None:
+    # one line (date, title and tag) per article, page_size lines at a time. The articles can come from
+    # a generator, they are only read as the pages are shown
+    def print_articles(self, articles : list, page_size=PAGE_SIZE) -> None:
+        shown = 0
         for article in articles:
-            print(article)
-            print("\n")
+            if shown and shown % page_size == 0:
+                if input("Enter para ver mais, 'q' para voltar: ").strip().lower() == 'q':
+                    return
+            print(article.get_summary())
+            shown += 1
+        if shown == 0:
+            self.error_message("Nenhum artigo encontrado!")
 
     def get_article_by_name(self, name) -> Article:
         try:
@@ -129,35 +191,110 @@ class UserInterface:
     def get_article_by_date(self, date) -> list:
         try:
             op = datetime.datetime.strptime(date, "%d/%m/%Y").date()
-            return self.library.get_articles_by_date(op)
+            return self.library.iter_articles_by_date(op)
         except Exception as e:
             print(e)
 
     def get_article_by_tag(self, tag) -> list:
         try:
-            return self.library.get_articles_by_tag(tag)
+            return self.library.iter_articles_by_tag(tag)
         except Exception as e:
             print(e)
     
+    # tag and date are optional filters, left empty they are ignored
+    def print_search_results(self, query) -> None:
+        tag = self.get_parameter("tema (deixe vazio para todos)") or None
+        since = self.get_parameter("data inicial no formato dd/mm/yyyy (deixe vazio para todas)")
+        try:
+            since = datetime.datetime.strptime(since, "%d/%m/%Y").date() if since else None
+            results = self.library.search(query, 10, tag, since)
+            found = False
+            for article, score in results:
+                found = True
+                print(article.get_summary() + ' | relevância ' + "{:.4f}".format(score))
+            if not found:
+                self.error_message("Nenhum artigo encontrado!")
+        except Exception as e:
+            print(e)
+
+    def print_most_similar(self, name) -> None:
+        article = self.get_article_by_name(name)
+        if article is None:
+            self.error_message("Artigo não encontrado!")
+            return
+        sim = self.library.get_most_similar(article, 1)
+        if not sim:
+            self.error_message("Não há outros artigos na biblioteca!")
+            return
+        print('Aqui está o artigo mais similar ao buscado!\n')
+        print(sim[0][0])
+        print('Similaridade: ' + str(sim[0][1]))
+
+    # pairs above a threshold, or the 20 most similar pairs when no threshold is given
+    def similar_pairs_report(self) -> None:
+        threshold = self.get_parameter("limiar de similaridade entre 0 e 1 (deixe vazio para os 20 pares mais similares)")
+        filepath = self.get_parameter("caminho do arquivo do relatório (CSV)")
+        try:
+            if threshold:
+                pairs = self.library.get_similar_pairs(threshold=float(threshold))
+            else:
+                pairs = self.library.get_similar_pairs(k=20)
+            save_pairs_report(filepath, pairs)
+            print(str(len(pairs)) + " pares salvos em " + filepath)
+        except Exception as e:
+            print(e)
+
+    def duplicates_report(self) -> None:
+        try:
+            groups = self.library.find_duplicates()
+        except Exception as e:
+            print(e)
+            return
+        if not groups:
+            print("Nenhum artigo duplicado!")
+        for number, group in enumerate(groups, 1):
+            print("Grupo " + str(number) + ":")
+            for article in group:
+                print("    " + article.get_summary())
+
     def remove_article(self, name) -> None:
         try:
             self.library.remove_article_by_name(name)
         except Exception as e:
             print(e)
 
+    # libraries are saved as JSON Lines, old .txt libraries are still loaded when there is no .jsonl
+    def get_library_path(self, library_name) -> str:
+        filepath = 'data/' + library_name + '.jsonl'
+        if not os.path.isfile(filepath) and os.path.isfile('data/' + library_name + '.txt'):
+            filepath = 'data/' + library_name + '.txt'
+        return filepath
+
     def save_and_exit(self, library_name) -> None:
-        self.save_library('data/' + library_name + '.txt')
+        self.save_library('data/' + library_name + '.jsonl')
+        self.library.close_journal()
         self.goodbye()
         exit()
 
     def exit_without_saving(self) -> None:
+        self.library.discard_journal()
+        self.library.close_journal()
         self.goodbye()
         exit()
 
     def process_option(self, option : int) -> None:
+        if self.profile_next_option and option != 9:
+            self.profile_next_option = False
+            _, stats = profile_operation(self._process_option, option)
+            print(stats)
+            return
+        with INSTRUMENTATION.measure('menu.' + str(option)):
+            self._process_option(option)
+
+    def _process_option(self, option : int) -> None:
         if option == 0:
             lib = input("Digite o nome da biblioteca sem a extensão. Ela deve estar na pasta 'data': ")
-            self.load_library('data/' + lib + ".txt")
+            self.load_library(self.get_library_path(lib))
         elif option == 1:
             self.add_menu()
             param = self.get_option(3)
@@ -169,20 +306,20 @@ class UserInterface:
             param = self.get_option(4)
             answer = self.process_search_option(param)
             if answer is not None:
-                if isinstance(answer, list):
-                    self.print_articles(answer)
-                else:
+                if isinstance(answer, Article):
                     print(answer)
+                else:
+                    self.print_articles(answer)
         elif option == 4:
             param = self.get_parameter("nome do artigo")
+            self.load_cache()
             sim = self.library.calculate_similarities(self.library.get_article_by_name(param))
             print('Aqui estão todas as similaridades com o artigo buscado!\n')
             print(sim)
         elif option == 5:
             param = self.get_parameter("nome do artigo")
-            sim = self.library.get_article_by_greatest_similarity(self.library.get_article_by_name(param))
-            print('Aqui está o artigo mais similar ao buscado!\n')
-            print(sim)
+            self.load_cache()
+            self.print_most_similar(param)
         elif option == 6:
             param = self.get_parameter("nome do artigo")
             self.remove_article(param)
@@ -191,6 +328,17 @@ class UserInterface:
             self.save_and_exit(lib)
         elif option == 8:
             self.exit_without_saving()
+        elif option == 9:
+            self.stats_menu()
+            param = self.get_option(4)
+            self.process_stats_option(param)
+        elif option == 10:
+            self.import_articles()
+        elif option == 11:
+            self.load_cache()
+            self.similar_pairs_report()
+        elif option == 12:
+            self.duplicates_report()
 
     
     def get_parameter(self, parameter_name : str) -> str:
@@ -210,11 +358,33 @@ class UserInterface:
         elif option == 2:
             answer = self.get_article_by_tag(self.get_parameter("tema"))
         elif option == 3:
+            self.print_search_results(self.get_parameter("palavras (use aspas para frases)"))
+        elif option == 4:
             pass
         else:
             self.error_message("Opção inválida!")
         return answer
 
+    def process_stats_option(self, option : int) -> None:
+        if option == 0:
+            if INSTRUMENTATION.enabled:
+                INSTRUMENTATION.disable()
+                print("Coleta de estatísticas desativada.")
+            else:
+                INSTRUMENTATION.enable()
+                print("Coleta de estatísticas ativada.")
+        elif option == 1:
+            print(INSTRUMENTATION.report())
+        elif option == 2:
+            filepath = self.get_parameter("caminho do arquivo (JSON)")
+            try:
+                INSTRUMENTATION.dump(filepath)
+            except Exception as e:
+                print(e)
+        elif option == 3:
+            self.profile_next_option = True
+            print("A próxima opção será perfilada.")
+
     def process_add_option(self, option : int) -> None:
         if option == 0:
             self.add_article()
@@ -1,11 +1,27 @@
+import asyncio
 import datetime
+import importlib.util
+import json
 import unittest
 import os
+import tempfile
 import io
 import sys
+import lets_alexandria.sharded_library
+from unittest import mock
+from lets_alexandria.benchmark import TAGS, generate_library, run_benchmark
+from lets_alexandria.cli import main as run_command
 from lets_alexandria.core_entities import Article, Library
+from lets_alexandria.dedup import DuplicateArticleError, hamming_distance, simhash
+from lets_alexandria.instrumentation import INSTRUMENTATION, profile_operation
+from lets_alexandria.server import LibraryClient, LibraryServer, ReadWriteLock, ServerError, measure_throughput
+from lets_alexandria.sharded_library import ShardedLibrary
+from lets_alexandria.sqlite_library import SQLiteLibrary
+from lets_alexandria.storage import convert_to_jsonl, save_pairs_report
 from lets_alexandria.user_interface import UserInterface
 
+HAS_SPARSE_BACKEND = importlib.util.find_spec("numpy") is not None and importlib.util.find_spec("scipy") is not None
+
 class AlexandriaTest(unittest.TestCase):
     # Testes da classe Article
     def test_simple_article_creation(self):
@@ -63,6 +79,55 @@ class AlexandriaTest(unittest.TestCase):
         article2 = Article(title="title", tag="tema", filepath="data/teste_file_artigo_2.txt")
         self.assertEqual(article1.calculate_similarity(article2), 0.3864)
 
+    def test_words_are_cached(self):
+        article = Article(title="title", tag="tema", text="um dois um")
+        words = article.get_words()
+        self.assertEqual(words, {"um", "dois"})
+        self.assertEqual(article.get_word_count(), 2)
+        self.assertIs(article.get_words(), words)
+
+    def test_set_text_invalidates_words(self):
+        article = Article(title="title", tag="tema", text="um dois")
+        article.get_words()
+        article.set_text("tres")
+        self.assertEqual(article.get_words(), {"tres"})
+        self.assertEqual(article.get_word_count(), 1)
+
+
+    def test_article_is_compact(self):
+        article1 = Article(title="title", tag="".join(["te", "ma"]), text="texto", date="21/10/2021")
+        article2 = Article(title="title_2", tag="".join(["tem", "a"]), text="texto")
+        self.assertFalse(hasattr(article1, "__dict__"))
+        self.assertIs(article1.get_tag(), article2.get_tag())
+        self.assertEqual(article1.get_date_ordinal(), datetime.date(2021, 10, 21).toordinal())
+        article3 = Article(title="title_3", tag="tema", text="texto", date="21/10/2021")
+        self.assertIs(article1.get_date_ordinal(), article3.get_date_ordinal())
+
+    def test_article_in_two_libraries(self):
+        article = Article(title="title", tag="tema", text="texto")
+        library1 = Library("BAE", [article])
+        library2 = Library("IMECC", [article])
+        article.set_title("novo")
+        self.assertIs(library1.get_article_by_name("novo"), article)
+        self.assertIs(library2.get_article_by_name("novo"), article)
+        library1.remove_article(article)
+        article.set_tag("tema_2")
+        self.assertEqual(library2.get_articles_by_tag("tema_2"), [article])
+        self.assertEqual(library1.get_articles_by_tag("tema_2"), [])
+
+    def test_token_ids(self):
+        article1 = Article(title="title", tag="tema", text="um dois tres")
+        article2 = Article(title="title_2", tag="tema", text="tres um")
+
+        library = Library("BAE", [article1, article2])
+        words = library.vocabulary.words
+        ids = article2.get_token_ids(library.vocabulary)
+        self.assertEqual(list(ids), sorted(ids))
+        self.assertEqual([words[i] for i in article1.get_token_ids(library.vocabulary)], words)
+        self.assertEqual({words[i] for i in ids}, {"tres", "um"})
+        article2.set_text("quatro um")
+        self.assertEqual({words[i] for i in article2.get_token_ids(library.vocabulary)}, {"quatro", "um"})
+        self.assertEqual(len(library.vocabulary), 4)
 
     # Testes da classe Library
     def test_simple_library_creation(self):
@@ -160,6 +225,46 @@ class AlexandriaTest(unittest.TestCase):
         library = Library("BAE", [article1, article2])
         self.assertEqual(library.get_articles_by_tag("tema_2"), []) 
     
+    def test_lookups_follow_article_setters(self):
+        article1 = Article(title="title", tag="tema", text="texto")
+        article2 = Article(title="title_2", tag="tema", text="texto")
+
+        library = Library("BAE", [article1, article2])
+        article1.set_title("novo")
+        article2.set_tag("tema_2")
+        self.assertEqual(library.get_article_by_name("title"), None)
+        self.assertEqual(library.get_article_by_name("novo"), article1)
+        self.assertEqual(library.get_articles_by_tag("tema"), [article1])
+        self.assertEqual(library.get_articles_by_tag("tema_2"), [article2])
+
+        library.remove_article_by_name("novo")
+        article1.set_tag("tema_2")
+        self.assertEqual(library.get_articles_by_tag("tema_2"), [article2])
+
+    def test_remove_article_with_same_title(self):
+        article1 = Article(title="title", tag="tema", text="texto")
+        article2 = Article(title="title", tag="tema", text="outro texto")
+
+        library = Library("BAE", [article1, article2])
+        library.remove_article(Article(title="title", tag="tema", text="outro texto"))
+        self.assertEqual(library.articles, [article1])
+        self.assertEqual(library.get_article_by_name("title"), article1)
+        with self.assertRaises(ValueError):
+            library.remove_article(article2)
+
+    def test_same_article_added_twice(self):
+        article1 = Article(title="title", tag="tema", text="texto")
+        article2 = Article(title="title_2", tag="tema", text="texto")
+
+        library = Library("BAE", [article1, article1])
+        library.add_article(article1)
+        library.add_articles([article2, article2])
+        self.assertEqual(library.get_articles_sorted(), [article2, article1])
+        article1.set_title("novo")
+        self.assertEqual(library.get_article_by_name("novo"), article1)
+        library.remove_article_by_name("novo")
+        self.assertEqual(library.get_articles_sorted(), [article2])
+
     def test_get_articles_by_date(self):
         article1 = Article(title="title", tag="tema", filepath="data/teste_file_artigo.txt")
         article2 = Article(title="title_2", tag="tema", filepath="data/teste_file_artigo_2.txt", date="21/10/2021")
@@ -174,6 +279,53 @@ class AlexandriaTest(unittest.TestCase):
         library = Library("BAE", [article1, article2])
         self.assertEqual(library.get_articles_sorted()[::-1], [article2, article1])
 
+    def test_search_words(self):
+        article1 = Article(title="title", tag="tema", filepath="data/teste_file_artigo.txt", date="25/10/2021")
+        article2 = Article(title="title_2", tag="tema", filepath="data/teste_file_artigo_2.txt", date="21/10/2021")
+        article3 = Article(title="title_3", tag="tema_2", text="Um anel? Um anel!", date="01/10/2021")
+
+        library = Library("BAE", [article1, article2, article3])
+        self.assertEqual([article for article, _ in library.search("anel")], [article3, article1])
+        self.assertEqual([article for article, _ in library.search("anel", tag="tema")], [article1])
+        self.assertEqual([article for article, _ in library.search("anel", since=datetime.date(2021, 10, 22))],
+                         [article1])
+        self.assertEqual([article for article, _ in library.search('"Anéis para os"')], [article2, article1])
+        self.assertEqual(list(library.search('"para os Anéis"')), [])
+        self.assertEqual(list(library.search("dragão")), [])
+
+    def test_search_follows_changes(self):
+        article1 = Article(title="title", tag="tema", text="um dragão")
+        article2 = Article(title="title_2", tag="tema", text="um anel")
+
+        library = Library("BAE", [article1, article2])
+        self.assertEqual([article for article, _ in library.search("dragão")], [article1])
+        article1.set_text("nada")
+        article2.set_text("outro dragão")
+        library.add_article(Article(title="title_3", tag="tema", text="dragão dragão"))
+        library.remove_article_by_name("title_3")
+        self.assertEqual([article for article, _ in library.search("dragão")], [article2])
+        self.assertEqual(list(library.search("um")), [])
+
+    def test_get_articles_between(self):
+        article1 = Article(title="title", tag="tema", text="texto", date="01/10/2021")
+        article2 = Article(title="title_2", tag="tema", text="texto", date="21/10/2021")
+        article3 = Article(title="title_3", tag="tema", text="texto", date="10/10/2021")
+
+        library = Library("BAE", [article1, article2, article3])
+        self.assertEqual(library.get_articles_between(datetime.date(2021, 10, 1), datetime.date(2021, 10, 10)),
+                         [article1, article3])
+        self.assertEqual(library.get_articles_by_date(datetime.date(2021, 10, 2)), [article3, article2])
+
+    def test_get_articles_sorted_follows_set_date(self):
+        article1 = Article(title="title", tag="tema", text="texto", date="01/10/2021")
+        article2 = Article(title="title_2", tag="tema", text="texto", date="21/10/2021")
+
+        library = Library("BAE", [article1, article2])
+        article1.set_date("30/10/2021")
+        self.assertEqual(article1.get_date(), datetime.date(2021, 10, 30))
+        self.assertEqual(list(library.iter_articles_sorted()), [article1, article2])
+        self.assertEqual(library.articles, [article1, article2])
+
     def test_calculate_similarity(self):
         article1 = Article(title="title", tag="tema", filepath="data/teste_file_artigo.txt")
         article2 = Article(title="title_2", tag="tema", filepath="data/teste_file_artigo_2.txt")
@@ -188,6 +340,91 @@ class AlexandriaTest(unittest.TestCase):
         library = Library("BAE", [article1, article2])
         self.assertEqual(library.calculate_all_similarities(), [[1.0, 0.3864],[0.3864, 1.0]])
 
+    def test_calculate_all_similarities_without_shared_words(self):
+        article1 = Article(title="title", tag="tema", text="um dois tres")
+        article2 = Article(title="title_2", tag="tema", text="quatro cinco")
+        article3 = Article(title="title_3", tag="tema", text="dois tres quatro")
+
+        library = Library("BAE", [article1, article2, article3])
+        self.assertEqual(library.calculate_all_similarities(), [[1.0, 0.0, 0.5], [0.0, 1.0, 0.25], [0.5, 0.25, 1.0]])
+
+    def test_calculate_all_similarities_follows_changes(self):
+        article1 = Article(title="title", tag="tema", text="um dois")
+        article2 = Article(title="title_2", tag="tema", text="tres")
+
+        library = Library("BAE", [article1, article2])
+        library.calculate_all_similarities()
+        article2.set_text("dois tres")
+        library.add_article(Article(title="title_3", tag="tema", text="um"))
+        library.remove_article_by_name("title")
+        self.assertEqual(library.calculate_all_similarities(), [[1.0, 0.0], [0.0, 1.0]])
+
+    def test_similarity_cache_follows_changes(self):
+        article1 = Article(title="title", tag="tema", text="um dois tres")
+        article2 = Article(title="title_2", tag="tema", text="um dois")
+
+        library = Library("BAE", [article1, article2])
+        self.assertEqual(library.calculate_similarities(article1), [1.0, 0.6667])
+        article3 = Article(title="title_3", tag="tema", text="tres quatro")
+        library.add_article(article3)
+        self.assertEqual(library.calculate_similarities(article1), [1.0, 0.6667, 0.25])
+        article2.set_text("quatro")
+        self.assertEqual(library.calculate_all_similarities(), [[1.0, 0.0, 0.25], [0.0, 1.0, 0.5], [0.25, 0.5, 1.0]])
+        self.assertEqual(library.get_most_similar(article3), [(article2, 0.5)])
+        library.remove_article(article2)
+        self.assertEqual(library.calculate_similarities(article3), [0.25, 1.0])
+
+    def test_similarity_rows_on_demand(self):
+        article1 = Article(title="title", tag="tema", text="um dois tres")
+        article2 = Article(title="title_2", tag="tema", text="um dois")
+        article3 = Article(title="title_3", tag="tema", text="tres quatro")
+
+        library = Library("BAE", [article1, article2, article3])
+        # only the article's row is scored, never every pair
+        with mock.patch("lets_alexandria.similarity.WordIndex.count_shared_words", side_effect=AssertionError):
+            self.assertEqual(library.calculate_similarities(article1), [1.0, 0.6667, 0.25])
+        library.remove_article(article3)
+        self.assertEqual(library.calculate_similarities(article1), [1.0, 0.6667])
+        article2.set_text("um")
+        self.assertEqual(library.calculate_similarities(article2), [0.3333, 1.0])
+        self.assertEqual(library.calculate_all_similarities(), [[1.0, 0.3333], [0.3333, 1.0]])
+
+    @unittest.skipUnless(HAS_SPARSE_BACKEND, "numpy and scipy are not installed")
+    def test_calculate_all_similarities_sparse(self):
+        article1 = Article(title="title", tag="tema", filepath="data/teste_file_artigo.txt")
+        article2 = Article(title="title_2", tag="tema", filepath="data/teste_file_artigo_2.txt")
+        article3 = Article(title="title_3", tag="tema", text="xyz abc")
+
+        library = Library("BAE", [article1, article2, article3])
+        expected = library.calculate_all_similarities()
+        self.assertEqual(library.calculate_all_similarities(backend='sparse'), expected)
+        self.assertEqual(library.calculate_all_similarities(backend='sparse', output='dense').tolist(), expected)
+        top = library.calculate_all_similarities(backend='sparse', output='topk', k=1)
+        self.assertEqual(top.toarray().tolist(), [[0.0, 0.3864, 0.0], [0.3864, 0.0, 0.0], [0.0, 0.0, 0.0]])
+
+    def test_calculate_all_similarities_parallel(self):
+        article1 = Article(title="title", tag="tema", filepath="data/teste_file_artigo.txt")
+        article2 = Article(title="title_2", tag="tema", filepath="data/teste_file_artigo_2.txt")
+        article3 = Article(title="title_3", tag="tema", text="Um Anel xyz")
+
+        library = Library("BAE", [article1, article2, article3])
+        self.assertEqual(library.calculate_all_similarities(backend='parallel', workers=2, chunk_size=1),
+                         library.calculate_all_similarities())
+
+    def test_calculate_similarities_parallel(self):
+        article1 = Article(title="title", tag="tema", filepath="data/teste_file_artigo.txt")
+        article2 = Article(title="title_2", tag="tema", filepath="data/teste_file_artigo_2.txt")
+        article3 = Article(title="title_3", tag="tema", text="Um Anel xyz")
+
+        library = Library("BAE", [article1, article2])
+        self.assertEqual(library.calculate_similarities(article3, workers=2, chunk_size=1),
+                         library.calculate_similarities(article3))
+
+    def test_calculate_all_similarities_unknown_backend(self):
+        library = Library("BAE", [Article(title="title", tag="tema", text="texto")])
+        with self.assertRaises(ValueError):
+            library.calculate_all_similarities(backend='gpu')
+
     def test_get_greatest_similarity(self):
         article1 = Article(title="title", tag="tema", filepath="data/teste_file_artigo.txt")
         article2 = Article(title="title_2", tag="tema", filepath="data/teste_file_artigo_2.txt")
@@ -202,6 +439,54 @@ class AlexandriaTest(unittest.TestCase):
         library = Library("BAE", [article1, article2])
         self.assertEqual(library.get_article_by_greatest_similarity(article1), article2)
 
+    def test_get_most_similar(self):
+        article1 = Article(title="title", tag="tema", text="um dois tres")
+        article2 = Article(title="title_2", tag="tema", text="um dois")
+        article3 = Article(title="title_3", tag="tema", text="um")
+
+        library = Library("BAE", [article1, article2, article3])
+        self.assertEqual(library.get_most_similar(article1, 2), [(article2, 0.6667), (article3, 0.3333)])
+
+    def test_get_most_similar_with_duplicates(self):
+        article1 = Article(title="title", tag="tema", text="um dois tres")
+        article2 = Article(title="title", tag="tema", text="um dois tres")
+        article3 = Article(title="title_3", tag="tema", text="um")
+
+        library = Library("BAE", [article1, article2, article3])
+        best = library.get_most_similar(article2, 1)
+        self.assertIs(best[0][0], article1)
+        self.assertEqual(best[0][1], 1.0)
+        self.assertEqual(library.get_greatest_similarity(article2), (0, 1.0))
+
+    def test_get_most_similar_alone(self):
+        article = Article(title="title", tag="tema", text="um")
+        library = Library("BAE", [article])
+        self.assertEqual(library.get_most_similar(article), [])
+        self.assertEqual(library.get_article_by_greatest_similarity(article), None)
+
+    def test_get_most_similar_with_lsh(self):
+        base = " ".join("palavra" + str(i) for i in range(60))
+        article1 = Article(title="title", tag="tema", text=base)
+        article2 = Article(title="title_2", tag="tema", text=base + " extra")
+        article3 = Article(title="title_3", tag="tema", text="nada a ver com o resto")
+
+        library = Library("BAE", [article1, article2])
+        library.enable_lsh(bands=16, rows=4)
+        library.add_article(article3)
+        self.assertEqual(library.get_most_similar(article1, 2), [(article2, 0.9836)])
+        self.assertEqual(library.get_most_similar(article1, 2, exact=True), [(article2, 0.9836), (article3, 0.0)])
+
+        library.remove_article(article2)
+        self.assertEqual(library.get_most_similar(article1, 2), [])
+
+    def test_lsh_follows_text_changes(self):
+        article1 = Article(title="title", tag="tema", text="um dois tres quatro")
+        article2 = Article(title="title_2", tag="tema", text="cinco seis")
+
+        library = Library("BAE", [article1, article2])
+        library.enable_lsh(bands=8, rows=2)
+        article2.set_text("um dois tres quatro")
+        self.assertEqual(library.get_most_similar(article1), [(article2, 1.0)])
 
     def test_save_library(self):
         article1 = Article(title="title", tag="tema", filepath="data/teste_file_artigo.txt")
@@ -224,6 +509,706 @@ class AlexandriaTest(unittest.TestCase):
         self.assertEqual(library2.get_articles(), [article1, article2])
         #os.remove("data/teste_file_biblioteca.txt")
 
+    def test_save_and_load_jsonl_library(self):
+        article1 = Article(title="title", tag="tema", filepath="data/teste_file_artigo.txt")
+        article2 = Article(title="título \"2\"", tag="política", text="linha 1\nlinha 2", date="21/10/2021")
+
+        library = Library("BAE", [article1, article2])
+        library2 = Library("IMECC")
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "biblioteca.jsonl")
+            library.save(filepath)
+            with open(filepath, encoding="utf-8") as file:
+                self.assertEqual(len(file.readlines()), 3)
+            library2.load(filepath)
+        self.assertEqual(library, library2)
+
+    def test_lazy_load_jsonl_library(self):
+        article1 = Article(title='title, "Text": x', tag="tema", filepath="data/teste_file_artigo.txt")
+        article2 = Article(title="title_2", tag="política", text='"Text" ção\n}', date="21/10/2021")
+
+        library = Library("BAE", [article1, article2])
+        library2 = Library("IMECC")
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "biblioteca.jsonl")
+            library.save(filepath)
+            library2.load(filepath, lazy=True)
+            articles = library2.get_articles()
+            self.assertFalse(articles[0].is_text_loaded())
+            self.assertEqual(library2.get_articles_by_tag("política")[0].get_title(), "title_2")
+            self.assertFalse(articles[1].is_text_loaded())
+            self.assertEqual(articles[1].get_text(), '"Text" ção\n}')
+            self.assertTrue(articles[1].is_text_loaded())
+            self.assertEqual(library, library2)
+
+    def test_lazy_load_other_jsonl_layouts(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "biblioteca.jsonl")
+            with open(filepath, "w", encoding="utf-8") as file:
+                file.write(json.dumps({"Library": "BAE"}) + "\n")
+                file.write(json.dumps({"Title": "title", "Tag": "tema", "Date": "01/10/2021", "Text": "texto"},
+                                      separators=(",", ":")) + "\n")
+                file.write(json.dumps({"Text": "outro texto", "Title": "title_2", "Tag": "tema",
+                                       "Date": "02/10/2021"}) + "\n")
+                file.write(json.dumps({"Title": "title_3", "Tag": "tema", "Date": "03/10/2021", "Text": "mais um",
+                                       "Source": "feed"}) + "\n")
+
+            library = Library("IMECC")
+            library.load(filepath, lazy=True)
+            self.assertEqual([article.get_text() for article in library.get_articles()],
+                             ["texto", "outro texto", "mais um"])
+
+            with open(filepath, "a", encoding="utf-8") as file:
+                file.write('{"Title": "title_4", "Tag": "tema", "Da')
+            with mock.patch("sys.stdout", new_callable=io.StringIO) as output:
+                library.load(filepath, lazy=True)
+            self.assertEqual(output.getvalue(), "Error loading Library!\n")
+
+    def test_journal_is_replayed_on_load(self):
+        article1 = Article(title="title", tag="tema", text="texto")
+        article2 = Article(title="title_2", tag="tema", text="outro texto")
+        article3 = Article(title="title_3", tag="tema", text="mais um texto")
+
+        library = Library("BAE", [article1, article2])
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "biblioteca.jsonl")
+            library.save(filepath)
+            library.open_journal(filepath, batch_size=1)
+            library.add_article(article3)
+            library.remove_article_by_name("title")
+            library.close_journal()
+
+            library2 = Library("IMECC")
+            library2.load(filepath)
+            self.assertEqual(library2.get_articles(), [article2, article3])
+
+    def test_save_with_journal_only_appends(self):
+        article1 = Article(title="title", tag="tema", text="texto")
+        article2 = Article(title="title_2", tag="tema", text="outro texto")
+
+        library = Library("BAE", [article1])
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "biblioteca.jsonl")
+            library.save(filepath)
+            with open(filepath, encoding="utf-8") as file:
+                snapshot = file.read()
+            library.open_journal(filepath)
+            library.add_article(article2)
+            library.save(filepath)
+            with open(filepath, encoding="utf-8") as file:
+                self.assertEqual(file.read(), snapshot)
+
+            article1.set_text("texto editado")
+            library.save(filepath)
+            library.close_journal()
+            library2 = Library("IMECC")
+            library2.load(filepath)
+            self.assertEqual(library2, library)
+
+    def test_compact_journal(self):
+        article1 = Article(title="title", tag="tema", text="texto")
+        article2 = Article(title="title_2", tag="tema", text="outro texto")
+
+        library = Library("BAE", [article1])
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "biblioteca.jsonl")
+            library.save(filepath)
+            library.open_journal(filepath)
+            library.add_article(article2)
+            library.compact()
+            library.add_article(Article(title="title_3", tag="tema", text="descartado"))
+            library.discard_journal()
+            library.close_journal()
+            with open(filepath + ".journal", encoding="utf-8") as file:
+                self.assertEqual(len(file.readlines()), 1)
+
+            library2 = Library("IMECC")
+            library2.load(filepath)
+            self.assertEqual(library2.get_articles(), [article1, article2])
+
+    def test_discard_journal_keeps_saved_changes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "biblioteca.jsonl")
+            Library("BAE", [Article(title="a", tag="tema", text="texto")]).save(filepath)
+
+            # salvar e sair, depois sair sem salvar
+            library = Library("BAE")
+            library.load(filepath)
+            library.open_journal(filepath)
+            library.add_article(Article(title="b", tag="tema", text="outro texto"))
+            library.save(filepath)
+            library.close_journal()
+
+            library = Library("BAE")
+            library.load(filepath)
+            library.open_journal(filepath)
+            library.add_article(Article(title="c", tag="tema", text="descartado"))
+            library.discard_journal()
+            library.close_journal()
+
+            library = Library("BAE")
+            library.load(filepath)
+            self.assertEqual([article.get_title() for article in library.get_articles()], ["a", "b"])
+
+    def test_save_as_keeps_old_journal(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "biblioteca.jsonl")
+            other = os.path.join(directory, "copia.jsonl")
+            Library("BAE", [Article(title="a", tag="tema", text="texto")]).save(filepath)
+
+            library = Library("BAE")
+            library.load(filepath)
+            library.open_journal(filepath)
+            library.add_article(Article(title="b", tag="tema", text="outro texto"))
+            library.save(filepath)
+            library.close_journal()
+
+            # salvar como outro arquivo
+            library = Library("BAE")
+            library.load(filepath)
+            library.open_journal(filepath)
+            library.add_article(Article(title="c", tag="tema", text="só na cópia"))
+            library.save(other)
+            library.add_article(Article(title="d", tag="tema", text="depois da cópia"))
+            library.save(other)
+            library.close_journal()
+
+            library = Library("BAE")
+            library.load(filepath)
+            self.assertEqual([article.get_title() for article in library.get_articles()], ["a", "b"])
+            library = Library("BAE")
+            library.load(other)
+            self.assertEqual([article.get_title() for article in library.get_articles()], ["a", "b", "c", "d"])
+
+    def test_save_after_clear_writes_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "biblioteca.jsonl")
+            Library("BAE", [Article(title="a", tag="tema", text="texto")]).save(filepath)
+
+            library = Library("BAE")
+            library.load(filepath)
+            library.open_journal(filepath)
+            library.clear()
+            library.save(filepath)
+            library.close_journal()
+
+            library = Library("BAE")
+            library.load(filepath)
+            self.assertEqual(library.get_articles(), [])
+
+    def test_save_compacts_long_journal(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "biblioteca.jsonl")
+            library = Library("BAE")
+            library.save(filepath)
+            library.open_journal(filepath, compact_after=3)
+            for i in range(2):
+                library.add_article(Article(title="title_" + str(i), tag="tema", text="texto"))
+            library.save(filepath)
+            library.add_article(Article(title="title_2", tag="tema", text="texto"))
+            library.save(filepath)
+            library.close_journal()
+            with open(filepath + ".journal", encoding="utf-8") as file:
+                self.assertEqual(len(file.readlines()), 1)
+
+            library2 = Library("IMECC")
+            library2.load(filepath)
+            self.assertEqual(library2, library)
+
+    def test_add_articles_keeps_date_order(self):
+        article1 = Article(title="title", tag="tema", text="texto", date="10/10/2021")
+        article2 = Article(title="title_2", tag="tema", text="texto", date="01/10/2021")
+        article3 = Article(title="title_3", tag="tema", text="texto", date="10/10/2021")
+        article4 = Article(title="title_4", tag="tema", text="texto", date="05/10/2021")
+
+        library = Library("BAE", [article1])
+        library.add_articles([article2, article3, article4])
+        self.assertEqual(library.articles, [article1, article2, article3, article4])
+        self.assertEqual(library.get_articles_sorted(), [article3, article1, article4, article2])
+
+    def test_remove_articles_with_same_date(self):
+        articles = [Article(title="title_" + str(i), tag="tema", text="texto", date="10/10/2021") for i in range(5)]
+
+        library = Library("BAE", articles)
+        library.remove_article_by_name("title_2")
+        articles[3].set_date("01/10/2021")
+        articles[3].set_date("10/10/2021")
+        self.assertEqual(library.get_articles_between(datetime.date(2021, 10, 10), datetime.date.max),
+                         [articles[0], articles[1], articles[4], articles[3]])
+
+    def test_import_articles_from_filenames(self):
+        with tempfile.TemporaryDirectory() as directory:
+            os.mkdir(os.path.join(directory, "esporte"))
+            with open(os.path.join(directory, "esporte", "esporte__21-10-2021__Final.txt"), "w", encoding="utf-8") as file:
+                file.write("gol no fim")
+            with open(os.path.join(directory, "sem_padrao.txt"), "w", encoding="utf-8") as file:
+                file.write("texto solto")
+
+            library = Library("BAE")
+            library.import_articles(directory, workers=2)
+        self.assertEqual(len(library.get_articles()), 2)
+        article = library.get_article_by_name("Final")
+        self.assertEqual(article.get_tag(), "esporte")
+        self.assertEqual(article.get_date(), datetime.date(2021, 10, 21))
+        self.assertEqual(article.get_text(), "gol no fim")
+        self.assertEqual(library.get_article_by_name("sem_padrao").get_text(), "texto solto")
+
+    def test_import_articles_with_manifest(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "a.txt"), "w", encoding="utf-8") as file:
+                file.write("eleição hoje")
+            with open(os.path.join(directory, "manifesto.csv"), "w", encoding="utf-8") as file:
+                file.write("File,Title,Tag,Date\na.txt,Eleições,política,01/10/2022\n")
+
+            library = Library("BAE")
+            library.import_articles(os.path.join(directory, "*.txt"), manifest=os.path.join(directory, "manifesto.csv"))
+        self.assertEqual(library.get_articles_by_tag("política")[0].get_title(), "Eleições")
+        self.assertEqual(library.get_articles_by_tag("política")[0].get_date(), datetime.date(2022, 10, 1))
+
+    def test_convert_to_jsonl(self):
+        library = Library("IMECC")
+        library2 = Library("IMECC")
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "bib_salva.jsonl")
+            convert_to_jsonl("data/bib_salva.txt", filepath)
+            library.load(filepath)
+        library2.load("data/bib_salva.txt")
+        self.assertEqual(library, library2)
+        self.assertEqual(len(library.get_articles()), 4)
+
+    # Testes da classe SQLiteLibrary
+    def test_sqlite_library_lookups(self):
+        article1 = Article(title="title", tag="tema", filepath="data/teste_file_artigo.txt", date="25/10/2021")
+        article2 = Article(title="title_2", tag="tema_2", filepath="data/teste_file_artigo_2.txt", date="21/10/2021")
+
+        library = SQLiteLibrary("BAE", articles=[article1, article2])
+        self.assertEqual(library.get_name(), "BAE")
+        self.assertEqual(library.get_article_by_name("title"), article1)
+        self.assertEqual(library.get_article_by_name("title_3"), None)
+        self.assertEqual(library.get_articles_by_tag("tema_2"), [article2])
+        self.assertEqual(library.get_articles_by_date(datetime.date(2021, 10, 22)), [article1])
+        self.assertEqual(library.get_articles_sorted(), [article1, article2])
+        self.assertEqual(library.search_words("Mordor Sombras"), [article1])
+        self.assertEqual(library.calculate_similarities(article1), [1.0, 0.3864])
+        self.assertEqual(library.get_most_similar(article1), [(article2, 0.3864)])
+        self.assertTrue(library.remove_article_by_name("title"))
+        self.assertFalse(library.remove_article_by_name("title"))
+        self.assertEqual(library.search_words("Mordor"), [])
+        library.close()
+
+    def test_sqlite_library_save_and_load(self):
+        article1 = Article(title="title", tag="tema", text="texto")
+        article2 = Article(title="title_2", tag="tema", text="outro texto", date="21/10/2021")
+
+        library = SQLiteLibrary("BAE", [article1, article2])
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "biblioteca.db")
+            library.save(filepath)
+            library2 = SQLiteLibrary("IMECC")
+            with self.assertRaises(FileNotFoundError):
+                library2.load(os.path.join(directory, "nada.db"))
+            self.assertFalse(os.path.exists(os.path.join(directory, "nada.db")))
+            library2.load(filepath)
+            self.assertEqual(library2.get_name(), "BAE")
+            self.assertEqual(library2.get_articles(), [article1, article2])
+            library2.close()
+        library.close()
+
+    # Testes do benchmark
+    def test_generate_library(self):
+        library = generate_library(30, vocabulary_size=50, words_per_article=10, seed=1)
+        self.assertEqual(len(library.get_articles()), 30)
+        self.assertTrue(all(article.get_tag() in TAGS for article in library.get_articles()))
+        self.assertEqual(library, generate_library(30, vocabulary_size=50, words_per_article=10, seed=1))
+
+    def test_run_benchmark(self):
+        results = run_benchmark(20, vocabulary_size=50, words_per_article=10, queries=5)
+        operations = json.loads(json.dumps(results))['operations']
+        self.assertIn('load_jsonl', operations)
+        self.assertIn('calculate_all_similarities_index', operations)
+        self.assertEqual(operations['get_article_by_name']['items'], 5)
+        self.assertIn('peak_memory_bytes', operations['save_jsonl'])
+
+    # Testes da instrumentação
+    def test_instrumentation_disabled_by_default(self):
+        INSTRUMENTATION.reset()
+        library = Library("BAE", [Article(title="title", tag="tema", text="texto")])
+        library.get_article_by_name("title")
+        self.assertEqual(INSTRUMENTATION.get_stats(), {})
+
+    def test_instrumentation_records_operations(self):
+        article1 = Article(title="title", tag="tema", text="texto")
+        article2 = Article(title="title_2", tag="tema", text="outro texto")
+        library = Library("BAE", [article1, article2])
+
+        INSTRUMENTATION.reset()
+        INSTRUMENTATION.enable()
+        try:
+            library.get_article_by_name("title")
+            library.get_article_by_name("title_3")
+            library.get_articles_by_tag("tema")
+            results = library.search("texto")
+            self.assertNotIn("lookup.words", INSTRUMENTATION.get_stats())
+            self.assertEqual(len(list(results)), 2)
+            with INSTRUMENTATION.measure("menu.2"):
+                library.get_articles_sorted()
+        finally:
+            INSTRUMENTATION.disable()
+        stats = INSTRUMENTATION.get_stats()
+        INSTRUMENTATION.reset()
+        self.assertEqual(stats["lookup.by_name"]["calls"], 2)
+        self.assertEqual(stats["lookup.by_name"]["items"], 1)
+        self.assertEqual(stats["lookup.by_tag"]["items"], 2)
+        self.assertEqual(stats["lookup.words"]["items"], 2)
+        self.assertEqual(stats["menu.2"]["calls"], 1)
+        self.assertLessEqual(stats["lookup.by_name"]["p50_seconds"], stats["lookup.by_name"]["p99_seconds"])
+
+    def test_profile_operation(self):
+        library = Library("BAE", [Article(title="title", tag="tema", text="texto")])
+        result, stats = profile_operation(library.get_article_by_name, "title")
+        self.assertEqual(result.get_title(), "title")
+        self.assertIn("get_article_by_name", stats)
+
+    def test_get_similar_pairs(self):
+        library = generate_library(60, vocabulary_size=300, words_per_article=30, seed=3)
+        articles = library.get_articles()
+        matrix = library.calculate_all_similarities()
+        expected = sorted(((articles[i], articles[j], matrix[i][j]) for i in range(len(articles))
+                           for j in range(i + 1, len(articles)) if matrix[i][j] > 0),
+                          key=lambda pair: -pair[2])
+        self.assertEqual([pair[2] for pair in library.get_similar_pairs(threshold=0.2)],
+                         [pair[2] for pair in expected if pair[2] >= 0.2])
+        self.assertEqual([pair[2] for pair in library.get_similar_pairs(k=15)], [pair[2] for pair in expected[:15]])
+        for article_a, article_b, similarity in library.get_similar_pairs(threshold=0.2):
+            self.assertEqual(article_a.calculate_similarity(article_b), similarity)
+        self.assertRaises(ValueError, library.get_similar_pairs)
+
+    def test_save_pairs_report(self):
+        article1 = Article(title="title", tag="tema", text="um dois três")
+        article2 = Article(title="title_2", tag="tema", text="um dois")
+        article3 = Article(title="title_3", tag="tema_2", text="um")
+        library = Library("BAE", [article1, article2, article3])
+
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "pares.csv")
+            save_pairs_report(filepath, library.get_similar_pairs(threshold=0.5))
+            with open(filepath, "r", encoding="utf-8") as file:
+                self.assertEqual(file.read().splitlines(), [
+                    "Similarity,Title A,Tag A,Title B,Tag B",
+                    "0.6667,title,tema,title_2,tema",
+                    "0.5000,title_2,tema,title_3,tema_2"])
+
+    def test_library_cache(self):
+        library = generate_library(30, vocabulary_size=100, words_per_article=20, seed=5)
+        matrix = library.calculate_all_similarities()
+        library.enable_lsh()
+
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "bae.jsonl")
+            library.save(filepath)
+            library.save_cache(filepath + ".cache")
+
+            loaded = Library("BAE")
+            loaded.load(filepath)
+            self.assertEqual(loaded.load_cache(filepath + ".cache"), 30)
+            self.assertEqual([article.get_words() for article in loaded.get_articles()],
+                             [article.get_words() for article in library.get_articles()])
+            self.assertEqual(loaded.calculate_all_similarities(), matrix)
+
+            loaded.get_articles()[0].set_text("outro texto")
+            loaded.remove_article(loaded.get_articles()[1])
+            loaded.add_article(Article(title="novo", tag="tema", text="palavra1 palavra2"))
+            loaded.save_cache(filepath + ".cache")
+            reloaded = Library("BAE", [Article.from_record(article.to_record()) for article in loaded.get_articles()])
+            self.assertEqual(reloaded.load_cache(filepath + ".cache"), 30)
+            self.assertEqual(reloaded.calculate_all_similarities(), Library("BAE", loaded.get_articles()).calculate_all_similarities())
+            self.assertEqual(Library("BAE").load_cache(os.path.join(directory, "nada.cache")), 0)
+
+    def test_cache_vocabulary_has_only_current_words(self):
+        library = Library("BAE", [Article(title="a", tag="tema", text="primeira palavra")])
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "bae.cache")
+            for i in range(3):
+                library.get_articles()[0].set_text("palavra sessao" + str(i))
+                library.calculate_all_similarities()
+                library.save_cache(filepath)
+            with open(filepath) as file:
+                cache = json.load(file)
+            self.assertEqual(sorted(cache['Vocabulary']), ["palavra", "sessao2"])
+
+    def test_user_interface_cache_only_when_needed(self):
+        library = Library("BAE", [Article(title="title_" + str(i), tag="tema", text="texto " + str(i)) for i in range(3)])
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "bae.jsonl")
+            library.save(filepath)
+
+            ui = UserInterface()
+            ui.load_library(filepath)
+            ui.save_library(filepath)
+            self.assertFalse(os.path.exists(filepath + ".cache"))
+            self.assertFalse(any(article.is_text_loaded() for article in ui.library.get_articles()))
+            with mock.patch("builtins.input", return_value="title_0"), \
+                    mock.patch("sys.stdout", new_callable=io.StringIO):
+                ui.process_option(4)
+            ui.save_library(filepath)
+            ui.library.close_journal()
+            self.assertTrue(os.path.exists(filepath + ".cache"))
+
+            # nothing changed since the cache was read, so it is not written again
+            ui = UserInterface()
+            ui.load_library(filepath)
+            with mock.patch("builtins.input", return_value="title_0"), \
+                    mock.patch("sys.stdout", new_callable=io.StringIO):
+                ui.process_option(5)
+            with mock.patch("lets_alexandria.core_entities.save_cache") as save_cache:
+                ui.save_library(filepath)
+            ui.library.close_journal()
+            save_cache.assert_not_called()
+
+    def test_simhash(self):
+        with open("data/teste_file_artigo.txt", "r") as file:
+            text = file.read()
+        edited = text.replace("Sete para os", "Oito para os")
+        with open("data/teste_file_artigo_2.txt", "r") as file:
+            other = file.read()
+        self.assertLessEqual(hamming_distance(simhash(text), simhash(edited)), 3)
+        self.assertGreater(hamming_distance(simhash(text), simhash(other)), 3)
+
+    def test_dedup_policies(self):
+        original = Article(title="title", tag="tema", filepath="data/teste_file_artigo.txt", date="01/10/2021")
+        edited = Article(title="title_2", tag="tema", text=original.get_text().replace("Sete", "Oito"), date="05/10/2021")
+        copy = Article(title="title_3", tag="tema", text=original.get_text().upper(), date="01/09/2021")
+        other = Article(title="title_4", tag="tema", filepath="data/teste_file_artigo_2.txt")
+
+        library = Library("BAE", [original, other])
+        library.enable_dedup("reject")
+        self.assertRaises(DuplicateArticleError, library.add_article, edited)
+        self.assertEqual(library.add_articles([copy, edited]), [])
+        self.assertEqual(len(library.get_articles()), 2)
+
+        library.enable_dedup("merge")
+        library.add_article(edited)
+        self.assertEqual(library.get_articles(), [original, other])
+        self.assertEqual(original.get_text(), edited.get_text())
+        self.assertEqual(original.get_date(), datetime.date(2021, 10, 5))
+        library.add_article(Article(title="title_5", tag="tema", text=copy.get_text(), date="01/09/2021"))
+        self.assertEqual(original.get_text(), edited.get_text())
+
+        library.enable_dedup("flag")
+        library.add_article(copy)
+        self.assertEqual(len(library.get_articles()), 3)
+        self.assertEqual(library.get_flagged_duplicates(), [(copy, original, 0)])
+        self.assertRaises(ValueError, library.enable_dedup, "ignore")
+
+    def test_find_duplicates(self):
+        original = Article(title="title", tag="tema", filepath="data/teste_file_artigo.txt")
+        edited = Article(title="title_2", tag="tema", text=original.get_text().replace("Sete", "Oito"))
+        other = Article(title="title_3", tag="tema", filepath="data/teste_file_artigo_2.txt")
+        copy = Article(title="title_4", tag="tema", text=other.get_text())
+
+        library = Library("BAE", [original, other, Article(title="title_5", tag="tema", text="nada"), edited, copy])
+        self.assertEqual(library.find_duplicates(), [[original, edited], [other, copy]])
+
+    def test_sharded_library(self):
+        article1 = Article(title="title", tag="esporte", text="um dois", date="25/10/2021")
+        article2 = Article(title="title_2", tag="política", text="dois três", date="21/10/2021")
+        article3 = Article(title="title_3", tag="esporte", text="três", date="01/10/2021")
+        library = ShardedLibrary("BAE", [article1, article2, article3])
+
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "bae.shards")
+            library.save(filepath)
+            self.assertEqual(sorted(os.listdir(filepath)), ["esporte.jsonl", "manifest.json", "política.jsonl"])
+
+            loaded = ShardedLibrary("outra")
+            loaded.load(filepath, lazy=True)
+            self.assertEqual(loaded.get_loaded_tags(), [])
+            self.assertEqual(loaded.get_tag_counts(), {"esporte": 2, "política": 1})
+            self.assertEqual(loaded.get_articles_by_tag("esporte"), [article1, article3])
+            self.assertEqual(loaded.get_loaded_tags(), ["esporte"])
+            self.assertEqual(loaded.get_most_similar(loaded.get_articles_by_tag("esporte")[0], 1, tag="esporte")[0][0],
+                             article3)
+            self.assertEqual(loaded.get_loaded_tags(), ["esporte"])
+            self.assertEqual(loaded.get_article_by_name("title_2"), article2)
+            self.assertEqual(loaded.get_loaded_tags(), ["esporte", "política"])
+            self.assertEqual(loaded.get_name(), "BAE")
+            self.assertEqual(loaded.get_articles_sorted(), library.get_articles_sorted())
+
+    def test_sharded_library_saves_changed_shards(self):
+        library = ShardedLibrary("BAE", [Article(title="title", tag="esporte", text="um"),
+                                         Article(title="title_2", tag="política", text="dois"),
+                                         Article(title="title_3", tag="tecnologia", text="três")])
+
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "bae.shards")
+            library.save(filepath)
+            loaded = ShardedLibrary("BAE")
+            loaded.load(filepath)
+            loaded.add_article(Article(title="title_4", tag="esporte", text="quatro"))
+            loaded.get_articles_by_tag("política")[0].set_tag("esporte")
+            with mock.patch("lets_alexandria.sharded_library.save_jsonl",
+                            wraps=lets_alexandria.sharded_library.save_jsonl) as save_jsonl:
+                loaded.save(filepath)
+            self.assertEqual([os.path.basename(call.args[0]) for call in save_jsonl.call_args_list],
+                             ["esporte.jsonl"])
+            self.assertEqual(sorted(os.listdir(filepath)), ["esporte.jsonl", "manifest.json", "tecnologia.jsonl"])
+
+            reloaded = ShardedLibrary("BAE")
+            reloaded.load(filepath)
+            self.assertEqual(reloaded.get_tag_counts(), {"esporte": 3, "tecnologia": 1})
+            self.assertEqual([article.get_title() for article in reloaded.get_articles_by_tag("esporte")],
+                             ["title", "title_4", "title_2"])
+
+    def test_sharded_library_load_another_with_lsh(self):
+        with tempfile.TemporaryDirectory() as directory:
+            ShardedLibrary("A", [Article(title="a1", tag="esporte", text="um")]).save(os.path.join(directory, "a.shards"))
+            ShardedLibrary("B", [Article(title="b1", tag="esporte", text="um")]).save(os.path.join(directory, "b.shards"))
+
+            library = ShardedLibrary("BAE")
+            library.enable_lsh()
+            library.load(os.path.join(directory, "a.shards"))
+            library.load(os.path.join(directory, "b.shards"))
+            self.assertEqual([article.get_title() for article in library.get_articles()], ["b1"])
+
+    def test_cli_queries(self):
+        article1 = Article(title="title", tag="tema", text="um anel para todos", date="25/10/2021")
+        article2 = Article(title="title_2", tag="tema_2", text="um anel", date="21/10/2021")
+        article3 = Article(title="title_3", tag="tema", text="nada", date="01/10/2021")
+
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "bae.jsonl")
+            Library("BAE", [article1, article2, article3]).save(filepath)
+
+            output = io.StringIO()
+            self.assertEqual(run_command(["list", filepath, "--since", "02/10/2021"], output), 0)
+            self.assertEqual(json.loads(output.getvalue()), [
+                {"Title": "title", "Tag": "tema", "Date": "25/10/2021"},
+                {"Title": "title_2", "Tag": "tema_2", "Date": "21/10/2021"}])
+
+            output = io.StringIO()
+            run_command(["search", filepath, "anel", "--tag", "tema_2", "--format", "csv"], output)
+            self.assertEqual(output.getvalue().splitlines()[0], "Title,Tag,Date,Score")
+            self.assertEqual(output.getvalue().splitlines()[1].split(",")[:3], ["title_2", "tema_2", "21/10/2021"])
+
+            output = io.StringIO()
+            run_command(["similar", filepath, "title", "--top", "2"], output)
+            self.assertEqual([row["Title"] for row in json.loads(output.getvalue())], ["title_2", "title_3"])
+
+            output = io.StringIO()
+            run_command(["load", filepath], output)
+            self.assertEqual(json.loads(output.getvalue()), [{"Library": "BAE", "Tag": "tema", "Articles": 2},
+                                                              {"Library": "BAE", "Tag": "tema_2", "Articles": 1}])
+
+            sys.stderr = io.StringIO()
+            self.assertEqual(run_command(["list", os.path.join(directory, "nada.jsonl")], io.StringIO()), 1)
+            sys.stderr = sys.__stderr__
+
+    def test_cli_reports_unreadable_library(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "bae.jsonl")
+            with open(filepath, "w", encoding="utf-8") as file:
+                file.write('{"Library": "BAE"}\n{"Title": "title", "Tag": "tema", "Da')
+
+            output = io.StringIO()
+            with mock.patch("sys.stderr", new_callable=io.StringIO) as errors, \
+                    mock.patch("sys.stdout", new_callable=io.StringIO) as stdout:
+                self.assertEqual(run_command(["list", filepath], output), 1)
+            self.assertEqual(output.getvalue(), "")
+            self.assertEqual(stdout.getvalue(), "")
+            self.assertIn("Não foi possível carregar a biblioteca", errors.getvalue())
+
+    def test_cli_import_and_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name, text in [("esporte__01-10-2021__jogo.txt", "o jogo de ontem"),
+                               ("esporte__02-10-2021__outro jogo.txt", "o jogo de hoje"),
+                               ("política__03-10-2021__eleição.txt", "a eleição")]:
+                with open(os.path.join(directory, name), "w", encoding="utf-8") as file:
+                    file.write(text)
+            filepath = os.path.join(directory, "nova.jsonl")
+
+            output = io.StringIO()
+            self.assertEqual(run_command(["import", filepath, directory], output), 0)
+            self.assertEqual(len(json.loads(output.getvalue())), 3)
+
+            output = io.StringIO()
+            run_command(["report", filepath, "--threshold", "0.5", "--format", "csv"], output)
+            self.assertEqual(output.getvalue().splitlines(), ["Similarity,Title A,Tag A,Title B,Tag B",
+                                                              "0.6,jogo,esporte,outro jogo,esporte"])
+
+    def test_read_write_lock(self):
+        events = []
+
+        async def read(name, lock, delay):
+            async with lock.reading():
+                events.append(name + " start")
+                await asyncio.sleep(delay)
+                events.append(name + " end")
+
+        async def write(name, lock):
+            async with lock.writing():
+                events.append(name + " start")
+                await asyncio.sleep(0)
+                events.append(name + " end")
+
+        async def run():
+            lock = ReadWriteLock()
+            first = asyncio.create_task(read("read_1", lock, 0.02))
+            await asyncio.sleep(0)
+            writer = asyncio.create_task(write("write", lock))
+            await asyncio.sleep(0)
+            # a reader arriving while the writer waits goes after it
+            second = asyncio.create_task(read("read_2", lock, 0))
+            await asyncio.gather(first, writer, second)
+
+        asyncio.run(run())
+        self.assertEqual(events, ["read_1 start", "read_1 end", "write start", "write end",
+                                  "read_2 start", "read_2 end"])
+
+    def test_server(self):
+        article1 = Article(title="title", tag="tema", text="um anel para todos", date="25/10/2021")
+        article2 = Article(title="title_2", tag="tema_2", text="um anel", date="21/10/2021")
+
+        async def run(filepath):
+            server = LibraryServer(filepath)
+            address = await server.start()
+            loop = asyncio.get_running_loop()
+
+            def use_client():
+                with LibraryClient(address) as client:
+                    self.assertEqual(client.request("count"), 2)
+                    with mock.patch.object(server.library, "get_articles", side_effect=RuntimeError("falha")):
+                        with self.assertRaises(ServerError):
+                            client.request("count")
+                    self.assertEqual(client.request("get", title="title")["Text"], "um anel para todos")
+                    self.assertEqual([row["Title"] for row in client.request("search", query="anel")],
+                                     ["title_2", "title"])
+                    self.assertEqual(client.request("similar", title="title")[0]["Title"], "title_2")
+                    self.assertEqual(client.request("add", article={"Title": "title_3", "Tag": "tema",
+                                                                    "Date": "01/10/2021", "Text": "nada"}), 3)
+                    self.assertEqual([row["Title"] for row in client.request("list", tag="tema")],
+                                     ["title", "title_3"])
+                    client.request("remove", title="title_2")
+                    client.request("save")
+                    with self.assertRaises(ServerError):
+                        client.request("get", title="title_2")
+
+            await loop.run_in_executor(None, use_client)
+            results = await measure_throughput(address, [{"op": "get", "title": "title"}, {"op": "count"}],
+                                               clients=4, requests_per_client=10)
+            await server.close()
+            return results
+
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "bae.jsonl")
+            Library("BAE", [article1, article2]).save(filepath)
+            results = asyncio.run(run(filepath))
+            self.assertEqual(results["requests"], 40)
+            self.assertGreater(results["requests_per_second"], 0)
+
+            library = Library("BAE")
+            library.load(filepath)
+            self.assertEqual(sorted(article.get_title() for article in library.get_articles()), ["title", "title_3"])
+
     # Testes para a classe userInterface
     def test_menu_user_interface(self):
         ui = UserInterface()
@@ -244,6 +1229,32 @@ class AlexandriaTest(unittest.TestCase):
         sys.stdout = sys.__stdout__
         self.assertTrue(expected_messsage in capturedOutput.getvalue())
 
+    def test_print_articles_paged(self):
+        ui = UserInterface()
+        ui.library = Library("BAE", [Article(title="title_" + str(i), tag="tema", text="texto " * 1000,
+                                             date="0" + str(i) + "/10/2021") for i in range(1, 6)])
+        capturedOutput = io.StringIO()
+        sys.stdout = capturedOutput
+        with mock.patch('builtins.input', side_effect=['', 'q']) as answers:
+            ui.print_articles(ui.list_articles(), page_size=2)
+        sys.stdout = sys.__stdout__
+        self.assertEqual(answers.call_count, 2)
+        self.assertEqual(capturedOutput.getvalue().splitlines(), [
+            "05/10/2021 | title_5 | tema", "04/10/2021 | title_4 | tema",
+            "03/10/2021 | title_3 | tema", "02/10/2021 | title_2 | tema"])
+
+    def test_iter_queries(self):
+        article1 = Article(title="title", tag="tema", text="texto", date="25/10/2021")
+        article2 = Article(title="title_2", tag="tema_2", text="texto", date="21/10/2021")
+        article3 = Article(title="title_3", tag="tema", text="texto", date="01/10/2021")
+
+        library = Library("BAE", [article1, article2, article3])
+        self.assertEqual(list(library.iter_articles_by_tag("tema")), library.get_articles_by_tag("tema"))
+        self.assertEqual(list(library.iter_articles_by_date(datetime.date(2021, 10, 2))),
+                         library.get_articles_by_date(datetime.date(2021, 10, 2)))
+        self.assertEqual(list(library.iter_articles_between(datetime.date(2021, 10, 1), datetime.date(2021, 10, 21))),
+                         [article3, article2])
+
     def test_greetings(self):
         ui = UserInterface()
         capturedOutput = io.StringIO()
@@ -1,7 +1,13 @@
-from lets_alexandria.core_entities import Article, Library
-from lets_alexandria.user_interface import UserInterface
-0
+import sys
+
+
+# with arguments, runs a single command (see lets_alexandria/cli.py), otherwise the interactive menu
 def main():
+    if len(sys.argv) > 1:
+        from lets_alexandria.cli import main as run_command
+        sys.exit(run_command(sys.argv[1:]))
+
+    from lets_alexandria.user_interface import UserInterface
     ui = UserInterface()
 
     ui.run()